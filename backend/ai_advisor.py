@@ -5,9 +5,9 @@ from database import Database
 from data_analyzer import UserDataAnalyzer
 
 class AIAdvisor:
-    def __init__(self):
-        """Initialize AI Advisor"""
-        self.db = Database()
+    def __init__(self, db=None):
+        """Initialize AI Advisor, reusing the caller's Database when given"""
+        self.db = db or Database()
         self.weather_api_key = os.getenv('WEATHER_API_KEY', '')
         self.analyzer = UserDataAnalyzer()
     
@@ -178,16 +178,34 @@ class AIAdvisor:
             ]
         }
     
-    def analyze_finances(self, user_profile, expenses):
-        """Analyze finances and provide saving tips"""
+    def analyze_finances(self, user_profile, expenses=None, summary=None):
+        """
+        Analyze finances and provide saving tips
+        Pass either `expenses` (any iterable) or a pre-aggregated `summary`
+        from Database.get_expense_summary
+        """
         if not user_profile:
             return {'message': 'User profile needed for analysis'}
         
         income = float(user_profile.get('monthlyIncome', 0))
         family_size = int(user_profile.get('familySize', 1))
         
-        # Calculate total expenses
-        total_expenses = sum(float(exp.get('amount', 0)) for exp in expenses)
+        if summary is not None:
+            total_expenses = float(summary.get('total', 0))
+            categories = {}
+            for category, totals in summary.get('categories', {}).items():
+                category = 'Other' if category is None else category
+                categories[category] = categories.get(category, 0) + float(totals['total'])
+        else:
+            # Total and per-category expenses in a single pass, so `expenses`
+            # may be a stream such as Database.iter_user_expenses
+            total_expenses = 0
+            categories = {}
+            for exp in expenses or []:
+                amount = float(exp.get('amount', 0))
+                category = exp.get('category', 'Other')
+                total_expenses += amount
+                categories[category] = categories.get(category, 0) + amount
         
         # Calculate savings
         savings = income - total_expenses
@@ -199,12 +217,6 @@ class AIAdvisor:
         if savings_rate < 20:
             recommendations.append('Aim to save at least 20% of your income')
         
-        # Analyze expense categories
-        categories = {}
-        for exp in expenses:
-            category = exp.get('category', 'Other')
-            categories[category] = categories.get(category, 0) + float(exp.get('amount', 0))
-        
         # Check for high dining expenses
         if 'Dining' in categories and categories['Dining'] > income * 0.15:
             potential_savings = categories['Dining'] - (income * 0.10)
@@ -5,31 +5,61 @@ import os
 import io
 from datetime import datetime
 from database import Database
+from cache import TTLCache, MISSING
 from ai_advisor import AIAdvisor
 from file_manager import FileManager
 from auth_manager import AuthManager
+from data_analyzer import UserDataAnalyzer
+from expense_store import ExpenseStore
+from expense_journal import ExpenseJournal
+from expense_import import detect_format, iter_csv_rows, iter_ndjson_rows, import_expenses
+from id_generator import new_id
 from finance_manager import (
     BudgetAI, ExpensePredictor, InvestmentAdvisor, 
     FinancialGoalTracker, generate_financial_health_score
 )
+from logging_setup import configure_logging
+from fanout import DeadlineExceeded, deadline_after
 from werkzeug.utils import secure_filename
+import logging
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+configure_logging(app)
+logger = logging.getLogger('lifepilot.app')
 
 # Initialize database, AI advisor, file manager, auth manager, and finance managers
 db = Database()
-ai_advisor = AIAdvisor()
+ai_advisor = AIAdvisor(db)
 file_manager = FileManager()
 auth_manager = AuthManager()
 budget_ai = BudgetAI()
-expense_predictor = ExpensePredictor()
+
+# Fitted forecasting parameters per user (see forecasting); refitted as months accumulate
+forecast_cache = TTLCache(
+    max_entries=int(os.getenv('FORECAST_CACHE_MAX_ENTRIES', 50000)),
+    ttl=float(os.getenv('FORECAST_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+    max_bytes=int(os.getenv('FORECAST_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+)
+expense_predictor = ExpensePredictor(forecast_cache=forecast_cache)
 investment_advisor = InvestmentAdvisor()
 goal_tracker = FinancialGoalTracker()
 
+# Serialized /api/analysis/comprehensive responses keyed by (user, data version, day);
+# any write to the user's expenses, tasks, meetings or profile bumps the version
+analysis_cache = TTLCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 1024)),
+    ttl=float(os.getenv('ANALYSIS_CACHE_TTL_SECONDS', 3600)),
+    max_bytes=int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+)
+
+# The comprehensive analysis fans its reads and analyses out on the shared pool
+# (FANOUT_WORKERS threads, 0 runs them one after another) and gives up after this
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv('ANALYSIS_DEADLINE_SECONDS', 10))
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {
     'pdf', 'xlsx', 'xls', 'xlsm', 'doc', 'docx', 'odt',
@@ -46,7 +76,11 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'message': 'Life Pilot AI Agent is running',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'cache': db.cache.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'forecast_cache': forecast_cache.stats(),
+        'write_behind': db.write_buffer.status() if db.write_buffer is not None else None
     })
 
 # ===================== AUTHENTICATION ENDPOINTS =====================
@@ -86,7 +120,7 @@ def register():
                 'success': False,
                 'message': message
             }), 400
-            
+    
     except Exception as e:
         return jsonify({
             'success': False,
@@ -125,7 +159,7 @@ def login():
                 'success': False,
                 'message': message
             }), 401
-            
+    
     except Exception as e:
         return jsonify({
             'success': False,
@@ -155,7 +189,7 @@ def create_guest():
                 'success': False,
                 'message': message
             }), 400
-            
+    
     except Exception as e:
         return jsonify({
             'success': False,
@@ -247,9 +281,14 @@ def create_user_profile():
         
         # Update profile data
         profile_data = {k: v for k, v in data.items() if k != 'user_id'}
-        success = auth_manager.update_user_profile_data(user_id, profile_data)
-        
-        if success:
+        profile_id = auth_manager.update_user_profile_data(user_id, profile_data)
+        
+        if profile_id:
+            # auth_manager writes the users document itself; drop the copy get_user_profile
+            # cached under the document's _id, and bump the version under that same id
+            # (the one /api/analysis/comprehensive reads its profile and version by)
+            db.cache.invalidate(('users', profile_id))
+            db.bump_data_version(profile_id)
             return jsonify({
                 'success': True,
                 'message': 'User profile saved successfully',
@@ -339,10 +378,10 @@ def financial_analysis():
         
         # Get user financial data
         user_profile = db.get_user_profile(user_id)
-        expenses = db.get_user_expenses(user_id)
+        expense_summary = db.get_rollup_summary(user_id)
         
         # Analyze and provide tips
-        analysis = ai_advisor.analyze_finances(user_profile, expenses)
+        analysis = ai_advisor.analyze_finances(user_profile, summary=expense_summary)
         
         return jsonify({
             'success': True,
@@ -403,33 +442,45 @@ def get_comprehensive_analysis():
                 'message': 'User ID required'
             }), 400
         
-        # Get user data
-        user_profile = db.get_user_profile(user_id)
+        # Unchanged data (same version) on the same day gives the same analysis;
+        # the version is read first so a concurrent write can only make the entry stale
+        today = datetime.now().strftime('%Y-%m-%d')
+        cache_key = (user_id, db.get_data_version(user_id), today)
+        body = analysis_cache.get(cache_key)
+        if body is not MISSING:
+            return app.response_class(body, mimetype='application/json', headers={'X-Cache': 'HIT'})
+        
+        # Get user data: the profile, pre-aggregated monthly rollups, and tasks and
+        # meetings (only the fields the analysis reads)
+        deadline = deadline_after(ANALYSIS_DEADLINE_SECONDS)
+        user_profile, expense_summary, tasks, meetings = db.get_analysis_inputs(user_id, today, deadline)
         if not user_profile:
             return jsonify({
                 'success': False,
                 'message': 'User not found'
             }), 404
         
-        # Get expenses, tasks, and meetings
-        expenses = db.get_user_expenses(user_id)
-        tasks = db.get_user_tasks(user_id)
-        today = datetime.now().strftime('%Y-%m-%d')
-        meetings = db.get_user_meetings(user_id, today)
-        
         # Generate comprehensive AI analysis
-        from data_analyzer import UserDataAnalyzer
         analyzer = UserDataAnalyzer()
-        
         insights = analyzer.generate_personalized_insights(
-            user_profile, expenses, tasks, meetings
+            user_profile, None, tasks, meetings,
+            expense_summary=expense_summary,
+            concurrent=True, deadline=deadline
         )
         
-        return jsonify({
+        body = app.json.dumps({
             'success': True,
             'data': insights,
             'generated_at': datetime.now().isoformat()
         })
+        analysis_cache.set(cache_key, body)
+        return app.response_class(body, mimetype='application/json', headers={'X-Cache': 'MISS'})
+    except DeadlineExceeded as e:
+        logger.warning('comprehensive analysis timed out', extra={'user_id': user_id, 'error': str(e)})
+        return jsonify({
+            'success': False,
+            'message': 'Analysis timed out, please retry'
+        }), 504
     except Exception as e:
         return jsonify({
             'success': False,
@@ -448,11 +499,15 @@ def analyze_spending():
                 'message': 'User ID required'
             }), 400
         
-        expenses = db.get_user_expenses(user_id)
-        
-        from data_analyzer import UserDataAnalyzer
         analyzer = UserDataAnalyzer()
-        analysis = analyzer.analyze_spending_patterns(expenses)
+        
+        # The running accumulator answers in O(categories); users with no expense
+        # written since it was introduced have none yet and use the rollups
+        accumulator = db.get_spending_accumulator(user_id)
+        if accumulator is not None:
+            analysis = accumulator.analyze(analyzer)
+        else:
+            analysis = analyzer.analyze_spending_summary(db.get_rollup_summary(user_id))
         
         return jsonify({
             'success': True,
@@ -476,11 +531,10 @@ def predict_expenses_analysis():
                 'message': 'User ID required'
             }), 400
         
-        expenses = db.get_user_expenses(user_id)
+        expense_summary = db.get_rollup_summary(user_id)
         
-        from data_analyzer import UserDataAnalyzer
-        analyzer = UserDataAnalyzer()
-        prediction = analyzer.predict_monthly_expenses(expenses)
+        analyzer = UserDataAnalyzer(forecast_cache=forecast_cache)
+        prediction = analyzer.predict_monthly_expenses_summary(expense_summary, user_id)
         
         return jsonify({
             'success': True,
@@ -817,6 +871,27 @@ def add_financial_goal():
             'message': str(e)
         }), 500
 
+@app.route('/api/finance/budget-actuals', methods=['GET'])
+def get_budget_actuals():
+    """Get actual spending per category for a budget month"""
+    try:
+        user_id = request.args.get('user_id', 'demo_user')
+        month = request.args.get('month', datetime.now().strftime('%Y-%m'))
+        
+        actuals = db.get_budget_actuals(user_id, month)
+        
+        return jsonify({
+            'success': True,
+            'month': month,
+            **actuals
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @app.route('/api/finance/ai-suggestions', methods=['POST'])
 def get_ai_financial_suggestions():
     """Get AI-powered financial suggestions"""
@@ -924,7 +999,7 @@ def predict_expenses_finance():
         data = request.json
         historical_data = data.get('historical_data', [])
         
-        prediction = expense_predictor.predict_next_month(historical_data)
+        prediction = expense_predictor.predict_next_month(historical_data, data.get('user_id'))
         
         return jsonify(prediction)
     
@@ -988,23 +1063,83 @@ def get_file_statistics():
 # DAILY COST TRACKER ENDPOINTS (NEW)
 # ============================================================================
 
-# In-memory storage for daily expenses (for demo purposes)
-daily_expenses_store = []
-regular_expenses_store = []
+# In-memory storage for daily expenses, journaled to EXPENSE_DATA_DIR so it
+# survives restarts (set EXPENSE_DATA_DIR to an empty value to keep it memory-only).
+# A journal has a single owning process: under several workers the first one to
+# start journals and the others stay memory-only, so give each worker its own
+# EXPENSE_DATA_DIR (or run one worker) if every worker needs durability.
+def _expense_journal(name):
+    data_dir = os.getenv('EXPENSE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'expense_data'))
+    if not data_dir:
+        return None
+    journal = ExpenseJournal(
+        data_dir, name,
+        fsync_interval=float(os.getenv('EXPENSE_FSYNC_INTERVAL', 0.05)),
+        snapshot_every=int(os.getenv('EXPENSE_SNAPSHOT_EVERY', 200000))
+    )
+    if not journal.acquire():
+        logger.warning('expense journal owned by another process, keeping %s memory-only', name,
+                       extra={'journal': name, 'directory': data_dir})
+        return None
+    return journal
+
+daily_expenses_store = ExpenseStore(id_field='id', journal=_expense_journal('daily_expenses'))
+regular_expenses_store = ExpenseStore(id_field='_id', journal=_expense_journal('regular_expenses'))
+
+# Largest page a listing will return
+MAX_PAGE_SIZE = 500
+
+def _expense_listing(store, user_id, year=None, month=None, extra=None):
+    """
+    Conditional, optionally paginated listing response for a cost tracker store
+    Query params: fields (comma-separated; the id is always included), and
+    limit / cursor for cursor pagination in id order (next_cursor in the response)
+    """
+    # The version is read before the records, so the ETag never outruns the body
+    etag = store.version(user_id)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    
+    body = {'success': True}
+    if limit is None and cursor is None:
+        if year is not None:
+            body['expenses'] = store.month_expenses(user_id, year, month, fields=fields)
+        else:
+            body['expenses'] = store.user_expenses(user_id, fields=fields)
+    else:
+        try:
+            limit = min(max(int(limit or 50), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'limit must be an integer'
+            }), 400
+        body['expenses'], body['next_cursor'] = store.page(
+            user_id, after=cursor, limit=limit, fields=fields, year=year, month=month
+        )
+    body.update(extra or {})
+    
+    response = jsonify(body)
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it every time (If-None-Match -> 304)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/api/finance/expenses', methods=['GET'])
 def get_expenses():
-    """Get user's expenses"""
+    """Get user's expenses (supports fields, limit/cursor and If-None-Match)"""
     try:
         user_id = request.args.get('user_id', 'demo_user')
         
-        # Filter expenses by user_id
-        user_expenses = [exp for exp in regular_expenses_store if exp.get('user_id') == user_id]
-        
-        return jsonify({
-            'success': True,
-            'expenses': user_expenses
-        })
+        return _expense_listing(regular_expenses_store, user_id)
     
     except Exception as e:
         return jsonify({
@@ -1016,13 +1151,11 @@ def get_expenses():
 def add_expense():
     """Add new expense"""
     try:
-        print("=== ADD EXPENSE REQUEST RECEIVED ===")
         data = request.json
-        print(f"Request data: {data}")
         user_id = data.get('user_id', 'demo_user')
         
         expense_data = {
-            '_id': f"EXP{int(datetime.now().timestamp() * 1000)}",
+            '_id': new_id('EXP'),
             'user_id': user_id,
             'amount': float(data.get('amount', 0)),
             'category': data.get('category', 'Other'),
@@ -1033,9 +1166,8 @@ def add_expense():
         }
         
         # Add to in-memory store
-        regular_expenses_store.append(expense_data)
-        print(f"Expense added successfully: {expense_data}")
-        print(f"Total expenses in store: {len(regular_expenses_store)}")
+        regular_expenses_store.add(expense_data)
+        logger.debug('Expense added', extra={'expense_id': expense_data['_id'], 'user_id': user_id})
         
         return jsonify({
             'success': True,
@@ -1044,9 +1176,7 @@ def add_expense():
         }), 201
     
     except Exception as e:
-        print(f"!!! ERROR adding expense: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error adding expense')
         return jsonify({
             'success': False,
             'message': str(e)
@@ -1056,9 +1186,8 @@ def add_expense():
 def delete_expense(expense_id):
     """Delete an expense"""
     try:
-        global regular_expenses_store
         # Remove from store
-        regular_expenses_store = [exp for exp in regular_expenses_store if exp.get('_id') != expense_id]
+        regular_expenses_store.delete(expense_id)
         
         return jsonify({
             'success': True,
@@ -1073,36 +1202,14 @@ def delete_expense(expense_id):
 
 @app.route('/api/finance/daily-expenses', methods=['GET'])
 def get_daily_expenses():
-    """Get daily expenses for a specific month"""
+    """Get daily expenses for a specific month (supports fields, limit/cursor and If-None-Match)"""
     try:
         user_id = request.args.get('user_id', 'demo_user')
         month = int(request.args.get('month', datetime.now().month))
         year = int(request.args.get('year', datetime.now().year))
         
-        # Filter expenses by month and year
-        filtered_expenses = [
-            exp for exp in daily_expenses_store
-            if exp.get('user_id') == user_id
-        ]
-        
-        # Filter by month/year if date is present
-        month_filtered = []
-        for exp in filtered_expenses:
-            exp_date = exp.get('date', '')
-            if exp_date:
-                try:
-                    exp_datetime = datetime.strptime(exp_date, '%Y-%m-%d')
-                    if exp_datetime.month == month and exp_datetime.year == year:
-                        month_filtered.append(exp)
-                except:
-                    pass
-        
-        return jsonify({
-            'success': True,
-            'expenses': month_filtered,
-            'month': month,
-            'year': year
-        })
+        # Records are bucketed by (year, month) when they are added
+        return _expense_listing(daily_expenses_store, user_id, year, month, {'month': month, 'year': year})
     
     except Exception as e:
         return jsonify({
@@ -1118,7 +1225,7 @@ def add_daily_expense():
         user_id = data.get('user_id', 'demo_user')
         
         expense = {
-            'id': f"EXP{int(datetime.now().timestamp() * 1000)}",
+            'id': new_id('EXP'),
             'user_id': user_id,
             'category': data.get('category'),
             'amount': float(data.get('amount', 0)),
@@ -1130,7 +1237,7 @@ def add_daily_expense():
         }
         
         # Save to in-memory store
-        daily_expenses_store.append(expense)
+        daily_expenses_store.add(expense)
         
         return jsonify({
             'success': True,
@@ -1148,9 +1255,8 @@ def add_daily_expense():
 def delete_daily_expense(expense_id):
     """Delete a daily expense"""
     try:
-        global daily_expenses_store
         # Delete from store
-        daily_expenses_store = [exp for exp in daily_expenses_store if exp.get('id') != expense_id]
+        daily_expenses_store.delete(expense_id)
         
         return jsonify({
             'success': True,
@@ -1163,36 +1269,121 @@ def delete_daily_expense(expense_id):
             'message': str(e)
         }), 500
 
-@app.route('/api/finance/predict-monthly-cost', methods=['POST'])
-def predict_monthly_cost():
-    """Predict monthly cost and provide AI suggestions based on daily expenses"""
+@app.route('/api/finance/expenses/import', methods=['POST'])
+def import_expenses_endpoint():
+    """
+    Bulk import expenses from a streamed CSV (header row) or NDJSON body
+    Query params: user_id (for rows without one), format (csv/ndjson, else from
+    Content-Type) and target: regular (default), daily or database
+    """
     try:
-        data = request.json
-        month = data.get('month', datetime.now().month)
-        year = data.get('year', datetime.now().year)
-        expenses = data.get('expenses', [])
-        
-        if len(expenses) < 3:
+        user_id = request.args.get('user_id', 'demo_user')
+        target = request.args.get('target', 'regular')
+        if target not in ('regular', 'daily', 'database'):
             return jsonify({
                 'success': False,
-                'message': 'Need at least 3 expenses for prediction'
+                'message': 'target must be one of: regular, daily, database'
             }), 400
+        try:
+            body_format = detect_format(request.content_type, request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        def insert_batch(expenses):
+            if target == 'database':
+                db.save_expenses(expenses)
+                return
+            created_at = datetime.now().isoformat()
+            records = []
+            for expense in expenses:
+                record = {
+                    'user_id': expense['user_id'],
+                    'amount': expense['amount'],
+                    'category': expense['category'],
+                    'description': expense.get('description', ''),
+                    'date': expense['date'],
+                    'payment_method': expense.get('payment_method', 'Cash'),
+                    'created_at': created_at
+                }
+                if target == 'daily':
+                    record['id'] = new_id('EXP')
+                    record['frequency'] = expense.get('frequency', 'daily')
+                else:
+                    record['_id'] = new_id('EXP')
+                records.append(record)
+            store = daily_expenses_store if target == 'daily' else regular_expenses_store
+            store.add_many(records)
         
-        # Calculate current totals
-        current_total = sum(float(exp.get('amount', 0)) for exp in expenses)
+        iter_rows = iter_csv_rows if body_format == 'csv' else iter_ndjson_rows
+        report = import_expenses(iter_rows(request.stream), insert_batch, default_user_id=user_id)
         
-        # Calculate category-wise spending
-        category_totals = {}
-        for exp in expenses:
-            category = exp.get('category', 'Other')
-            category_totals[category] = category_totals.get(category, 0) + float(exp.get('amount', 0))
+        return jsonify({
+            'success': True,
+            'format': body_format,
+            'target': target,
+            **report
+        })
+    
+    except Exception as e:
+        logger.exception('Error importing expenses')
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@app.route('/api/finance/predict-monthly-cost', methods=['POST'])
+def predict_monthly_cost():
+    """
+    Predict monthly cost and provide AI suggestions based on daily expenses
+    Send `expenses` to predict from a client-side list, or just `user_id` to
+    predict from the server-side daily store's running month aggregate
+    """
+    try:
+        data = request.json
+        month = int(data.get('month', datetime.now().month))
+        year = int(data.get('year', datetime.now().year))
         
-        # Get days tracked
-        dates = [exp.get('date') for exp in expenses if exp.get('date')]
-        if dates:
-            days_tracked = len(set(dates))
+        if 'expenses' in data:
+            expenses = data.get('expenses') or []
+            
+            if len(expenses) < 3:
+                return jsonify({
+                    'success': False,
+                    'message': 'Need at least 3 expenses for prediction'
+                }), 400
+            
+            # Calculate current totals
+            current_total = sum(float(exp.get('amount', 0)) for exp in expenses)
+            
+            # Calculate category-wise spending
+            category_totals = {}
+            for exp in expenses:
+                category = exp.get('category', 'Other')
+                category_totals[category] = category_totals.get(category, 0) + float(exp.get('amount', 0))
+            
+            # Get days tracked
+            dates = [exp.get('date') for exp in expenses if exp.get('date')]
+            if dates:
+                days_tracked = len(set(dates))
+            else:
+                days_tracked = len(expenses)
         else:
-            days_tracked = len(expenses)
+            # Totals, category sums and distinct days are kept up to date on every add/delete
+            user_id = data.get('user_id', 'demo_user')
+            totals = daily_expenses_store.month_totals(user_id, year, month)
+            
+            if totals['count'] < 3:
+                return jsonify({
+                    'success': False,
+                    'message': 'Need at least 3 expenses for prediction'
+                }), 400
+            
+            current_total = totals['total']
+            category_totals = {}
+            for category, amount in totals['categories'].items():
+                category = category if category is not None else 'Other'
+                category_totals[category] = category_totals.get(category, 0) + amount
+            days_tracked = totals['days']
         
         # Calculate average daily spending
         avg_daily = current_total / max(days_tracked, 1)
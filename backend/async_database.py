@@ -0,0 +1,580 @@
+"""
+Asyncio counterpart of Database, built on Motor
+Same method surface as database.Database with coroutines in place of blocking
+calls, so an async serving mode can multiplex many dashboard requests per process
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from mongo_client import get_async_client, get_mongo_uri, get_database_name
+from cache import TTLCache, MISSING
+from database import (
+    Database, INDEXES, EXPENSE_BATCH_SIZE, _projection, _read_rows, _rollup_updates,
+    _summary_pipeline, _summary_from_facets, _rebuild_pipeline, _combine_rollups,
+    _budget_actuals, _backfill_markers, ROLLUP_BACKFILL_TIMEOUT, VERSIONED_COLLECTIONS, _version_updates,
+    _plan_report
+)
+from spending_accumulator import SpendingAccumulator, accumulator_updates
+from fanout import DeadlineExceeded, _remaining
+import logging
+import os
+
+logger = logging.getLogger('lifepilot.async_database')
+
+
+def _in_thread(func, *args):
+    """Run a blocking call on the loop's default executor (asyncio.to_thread needs 3.9)"""
+    return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class AsyncDatabase:
+    """
+    Motor-backed Database
+    Collections resolve against the running event loop's client, so one instance
+    can be created at import time and shared by every loop. Await ensure_indexes()
+    once at startup. Inserts are written directly unless write-behind is enabled.
+    """
+    
+    def __init__(self):
+        """Initialize MongoDB settings (the connection opens on first use)"""
+        self.mongo_uri = get_mongo_uri()
+        self.db_name = get_database_name()
+        
+        # Read-through cache for rarely changing per-user documents
+        self.cache = TTLCache(
+            max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 4096)),
+            ttl=float(os.getenv('CACHE_TTL_SECONDS', 300)),
+            max_bytes=int(os.getenv('CACHE_MAX_BYTES', 16 * 1024 * 1024))
+        )
+        self._rollups_ready = set()  # users known to have a rollup_backfills marker
+        
+        # Opt-in write-behind buffering for expenses, tasks and meetings
+        self.write_buffer = None
+        self._buffered_db = None
+        if os.getenv('WRITE_BEHIND_ENABLED', '').lower() in ('1', 'true', 'yes'):
+            self.enable_write_behind()
+    
+    def enable_write_behind(self, max_batch=None, max_delay=None):
+        """
+        Buffer save_expense / save_task / save_meeting inserts into insert_many
+        batches, like Database.enable_write_behind
+        The buffer flushes on its own thread, so it writes through a blocking
+        Database, which also maintains rollups, accumulators and data versions
+        for the documents it flushes
+        """
+        if self.write_buffer is None:
+            self._buffered_db = Database()
+            self.write_buffer = self._buffered_db.enable_write_behind(max_batch, max_delay)
+        return self.write_buffer
+    
+    async def flush_writes(self):
+        """Write out buffered inserts; returns the Database.flush_writes report"""
+        if self.write_buffer is None:
+            return {'inserted': {}, 'pending': 0, 'failed': 0, 'last_error': None}
+        return await _in_thread(self._buffered_db.flush_writes)
+    
+    async def close(self):
+        """Flush buffered inserts (await on shutdown); returns the flush_writes report"""
+        if self.write_buffer is None:
+            return {'inserted': {}, 'pending': 0, 'failed': 0, 'last_error': None}
+        return await _in_thread(self._buffered_db.close)
+    
+    @property
+    def client(self):
+        return get_async_client(self.mongo_uri)
+    
+    @property
+    def db(self):
+        return self.client[self.db_name]
+    
+    @property
+    def users(self):
+        return self.db['users']
+    
+    @property
+    def routines(self):
+        return self.db['routines']
+    
+    @property
+    def meetings(self):
+        return self.db['meetings']
+    
+    @property
+    def expenses(self):
+        return self.db['expenses']
+    
+    @property
+    def tasks(self):
+        return self.db['tasks']
+    
+    @property
+    def monthly_rollups(self):
+        return self.db['monthly_rollups']
+    
+    @property
+    def data_versions(self):
+        return self.db['data_versions']
+    
+    @property
+    def spending_accumulators(self):
+        return self.db['spending_accumulators']
+    
+    @property
+    def rollup_backfills(self):
+        return self.db['rollup_backfills']
+    
+    async def ensure_indexes(self):
+        """Apply the index manifest (ignore indexes that already exist)"""
+        for collection_name, indexes in INDEXES.items():
+            for keys, options in indexes:
+                try:
+                    await self.db[collection_name].create_index(keys, **options)
+                except Exception as e:
+                    print(f"Index creation warning ({collection_name}): {e}")
+    
+    def _query_shapes(self, user_id):
+        """Cursors for every get_* query, used by the plan audit (see Database._query_shapes)"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        return [
+            ('get_user_profile', 'users', self.users.find({'_id': ObjectId()}).limit(1)),
+            ('get_user_routines', 'routines', self._routines_cursor(user_id)),
+            ('get_user_meetings', 'meetings', self._meetings_cursor(user_id)),
+            ('get_user_meetings(date)', 'meetings', self._meetings_cursor(user_id, today)),
+            ('get_user_expenses', 'expenses', self._expenses_cursor(user_id)),
+            ('get_user_expenses(range)', 'expenses', self._expenses_cursor(user_id, today, today)),
+            ('get_user_tasks', 'tasks', self._tasks_cursor(user_id)),
+            ('get_user_tasks(date)', 'tasks', self._tasks_cursor(user_id, today)),
+            ('get_user_finance_profile', 'finance_profiles',
+             self.db['finance_profiles'].find({'user_id': user_id}).limit(1)),
+            ('get_user_location', 'user_locations',
+             self.db['user_locations'].find({'user_id': user_id}).limit(1)),
+            ('get_financial_goals', 'financial_goals', self._goals_cursor(user_id)),
+        ]
+    
+    async def audit_query_plans(self, user_id='__plan_audit__'):
+        """
+        Run explain() on each get_* query and flag plans that are not index-backed
+        
+        Returns:
+            List of {query, collection, stages, indexes, index_backed, blocking_sort}
+        """
+        return [
+            _plan_report(name, collection_name, await cursor.explain())
+            for name, collection_name, cursor in self._query_shapes(user_id)
+        ]
+    
+    async def _cached(self, collection_name, user_id, loader):
+        """Serve (collection, user) reads from the cache, awaiting loader() on a miss"""
+        key = (collection_name, user_id)
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = await loader()
+            self.cache.set(key, value)
+        return value
+    
+    async def _insert(self, collection, document):
+        """Insert one document and maintain derived data (through the write-behind buffer when enabled)"""
+        if self.write_buffer is not None:
+            # add() flushes inline once a batch is full, so keep it off the event loop
+            return await _in_thread(self.write_buffer.add, collection.name, document)
+        result = await collection.insert_one(document)
+        await self._after_insert(collection.name, [document])
+        return result.inserted_id
+    
+    async def _after_insert(self, collection_name, documents):
+        """Maintain derived data once documents are actually written"""
+        if collection_name == 'expenses':
+            await self._apply_rollups(documents)
+            await self._apply_accumulators(documents)
+        if collection_name in VERSIONED_COLLECTIONS:
+            await self.bump_data_version(document.get('user_id') for document in documents)
+    
+    async def bump_data_version(self, user_ids):
+        """Increment the data version of each user (one id or an iterable of ids)"""
+        updates = _version_updates([user_ids] if isinstance(user_ids, str) else user_ids)
+        if not updates:
+            return
+        try:
+            await self.data_versions.bulk_write(updates, ordered=False)
+        except Exception:
+            logger.exception('Error updating data versions')
+    
+    async def get_data_version(self, user_id):
+        """Current data version of a user (0 before any tracked write)"""
+        document = await self.data_versions.find_one({'_id': str(user_id)}, {'version': 1})
+        return document['version'] if document else 0
+    
+    async def save_user_profile(self, user_data):
+        """Save or update user profile"""
+        user_data['updated_at'] = datetime.now()
+        
+        if 'created_at' not in user_data:
+            user_data['created_at'] = datetime.now()
+        
+        result = await self.users.insert_one(user_data)
+        self.cache.invalidate(('users', str(result.inserted_id)))
+        await self.bump_data_version(str(result.inserted_id))
+        return result.inserted_id
+    
+    async def get_user_profile(self, user_id):
+        """Get user profile by ID"""
+        try:
+            object_id = ObjectId(user_id)
+        except:
+            return None
+        
+        async def load():
+            user = await self.users.find_one({'_id': object_id})
+            if user:
+                user['_id'] = str(user['_id'])
+            return user
+        
+        try:
+            return await self._cached('users', str(user_id), load)
+        except:
+            return None
+    
+    async def save_routine(self, routine_data):
+        """Save a routine"""
+        routine_data['created_at'] = datetime.now()
+        result = await self.routines.insert_one(routine_data)
+        return result.inserted_id
+    
+    def _routines_cursor(self, user_id):
+        """Cursor for a user's routines query"""
+        return self.routines.find({'user_id': user_id})
+    
+    async def get_user_routines(self, user_id):
+        """Get all routines for a user"""
+        routines = await self._routines_cursor(user_id).to_list(None)
+        for routine in routines:
+            routine['_id'] = str(routine['_id'])
+        return routines
+    
+    async def save_meeting(self, meeting_data):
+        """Save a meeting or event"""
+        meeting_data['created_at'] = datetime.now()
+        return await self._insert(self.meetings, meeting_data)
+    
+    def _meetings_cursor(self, user_id, date=None, projection=None):
+        """Cursor for a user's meetings query"""
+        query = {'user_id': user_id}
+        if date:
+            query['date'] = date
+        return self.meetings.find(query, projection).sort('date', 1)
+    
+    async def get_user_meetings(self, user_id, date=None, fields=None, lean=None):
+        """Get meetings for a user, optionally filtered by date"""
+        cursor = self._meetings_cursor(user_id, date, _projection(fields))
+        return _read_rows(await cursor.to_list(None), fields, lean)
+    
+    async def save_expense(self, expense_data):
+        """Save an expense record"""
+        expense_data['created_at'] = datetime.now()
+        return await self._insert(self.expenses, expense_data)
+    
+    async def save_expenses(self, expenses):
+        """Save many expense records with one insert_many call; returns their ids"""
+        if not expenses:
+            return []
+        now = datetime.now()
+        for expense_data in expenses:
+            expense_data['created_at'] = now
+        if self.write_buffer is not None:
+            # Motor collections belong to the loop, so name the collection for the worker thread
+            return await _in_thread(
+                lambda: [self.write_buffer.add('expenses', expense) for expense in expenses]
+            )
+        try:
+            result = await self.expenses.insert_many(expenses, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            await self._after_insert('expenses', [exp for i, exp in enumerate(expenses) if i not in failed])
+            raise
+        await self._after_insert('expenses', expenses)
+        return result.inserted_ids
+    
+    def _expenses_cursor(self, user_id, start_date=None, end_date=None, projection=None):
+        """Cursor for a user's expenses query"""
+        query = {'user_id': user_id}
+        if start_date and end_date:
+            query['date'] = {'$gte': start_date, '$lte': end_date}
+        return self.expenses.find(query, projection).sort('date', -1)
+    
+    async def get_user_expenses(self, user_id, start_date=None, end_date=None, fields=None, lean=None):
+        """Get expenses for a user within a date range"""
+        cursor = self._expenses_cursor(user_id, start_date, end_date, _projection(fields))
+        return _read_rows(await cursor.to_list(None), fields, lean)
+    
+    async def iter_user_expenses(self, user_id, start_date=None, end_date=None, fields=None,
+                                 batch_size=EXPENSE_BATCH_SIZE):
+        """Stream a user's expenses one document at a time (async generator)"""
+        cursor = self._expenses_cursor(user_id, start_date, end_date, _projection(fields))
+        async for expense in cursor.batch_size(batch_size):
+            if '_id' in expense:
+                expense['_id'] = str(expense['_id'])
+            yield expense
+    
+    async def get_expense_summary(self, user_id, start_date=None, end_date=None):
+        """Pre-aggregate a user's expenses in MongoDB (see Database.get_expense_summary)"""
+        query = {'user_id': user_id}
+        if start_date and end_date:
+            query['date'] = {'$gte': start_date, '$lte': end_date}
+        results = await self.expenses.aggregate(_summary_pipeline(query)).to_list(1)
+        return _summary_from_facets(results[0] if results else {})
+    
+    async def _apply_rollups(self, expenses):
+        """$inc the monthly_rollups documents for newly written expenses"""
+        try:
+            # Users whose rollups this call built, or a build in progress will count, skip the $inc
+            skipped = set()
+            for user_id in {expense.get('user_id') for expense in expenses}:
+                if user_id is not None and await self._ensure_rollups(user_id, writing=True):
+                    skipped.add(user_id)
+            updates = _rollup_updates(expense for expense in expenses if expense.get('user_id') not in skipped)
+            if updates:
+                await self.monthly_rollups.bulk_write(updates, ordered=False)
+        except Exception:
+            # The expense itself is stored; rebuild_monthly_rollups() repairs the drift
+            logger.exception('Error updating monthly rollups')
+    
+    async def _ensure_rollups(self, user_id, writing=False):
+        """Build a user's monthly_rollups on first use, like Database._ensure_rollups"""
+        if user_id in self._rollups_ready:
+            return False
+        now = datetime.now()
+        try:
+            await self.rollup_backfills.insert_one({
+                '_id': user_id, 'state': 'building', 'dirty': False, 'started_at': now, 'created_at': now
+            })
+        except DuplicateKeyError:
+            if writing:
+                marker = await self.rollup_backfills.find_one_and_update(
+                    {'_id': user_id, 'state': 'building'}, {'$set': {'dirty': True}}
+                )
+            else:
+                marker = await self.rollup_backfills.find_one({'_id': user_id})
+            if marker is None or marker.get('state', 'ready') != 'building':
+                self._rollups_ready.add(user_id)
+                return False
+            if marker['started_at'] > now - timedelta(seconds=ROLLUP_BACKFILL_TIMEOUT):
+                return writing
+            result = await self.rollup_backfills.update_one(
+                {'_id': user_id, 'state': 'building', 'started_at': marker['started_at']},
+                {'$set': {'started_at': now, 'dirty': False}}
+            )
+            if result.matched_count == 0:
+                return writing
+        await self._build_rollups(user_id)
+        return True
+    
+    async def _build_rollups(self, user_id):
+        """Rebuild a user's rollups until no write lands during a pass, like Database._build_rollups"""
+        try:
+            while True:
+                await self._rebuild_rollups({'user_id': user_id})
+                result = await self.rollup_backfills.update_one(
+                    {'_id': user_id, 'state': 'building', 'dirty': False}, {'$set': {'state': 'ready'}}
+                )
+                if result.matched_count:
+                    break
+                result = await self.rollup_backfills.update_one(
+                    {'_id': user_id, 'state': 'building', 'dirty': True}, {'$set': {'dirty': False}}
+                )
+                if result.matched_count == 0:
+                    break
+        except Exception:
+            await self.rollup_backfills.delete_one({'_id': user_id})
+            raise
+        self._rollups_ready.add(user_id)
+    
+    async def _apply_accumulators(self, expenses):
+        """$inc the spending_accumulators documents for newly written expenses"""
+        updates = accumulator_updates(expenses)
+        if not updates:
+            return
+        try:
+            result = await self.spending_accumulators.bulk_write(list(updates.values()), ordered=False)
+            # A newly created document only holds this batch: backfill the user's older expenses once
+            user_ids = list(updates)
+            for index in result.upserted_ids:
+                await self.rebuild_spending_accumulators(user_ids[index])
+        except Exception:
+            # The expense itself is stored; rebuild_spending_accumulators() repairs the drift
+            logger.exception('Error updating spending accumulators')
+    
+    async def rebuild_spending_accumulators(self, user_id=None):
+        """
+        Backfill or rebuild spending_accumulators from the expenses collection
+        Rebuilds one user when user_id is given, otherwise every user; returns the count
+        """
+        if user_id is None:
+            await self.spending_accumulators.delete_many({})
+        user_ids = [user_id] if user_id is not None else await self.expenses.distinct('user_id')
+        for uid in user_ids:
+            accumulator = SpendingAccumulator()
+            async for expense in self.iter_user_expenses(uid, fields=('amount', 'category', 'date')):
+                accumulator.add(expense)
+            document = dict(accumulator.to_document(), user_id=uid, updated_at=datetime.now())
+            await self.spending_accumulators.replace_one({'user_id': uid}, document, upsert=True)
+        return len(user_ids)
+    
+    async def get_spending_accumulator(self, user_id):
+        """A user's SpendingAccumulator, or None if none has been written yet"""
+        document = await self.spending_accumulators.find_one({'user_id': user_id}, {'_id': 0})
+        return SpendingAccumulator.from_document(document) if document else None
+    
+    async def rebuild_monthly_rollups(self, user_id=None):
+        """Backfill or rebuild monthly_rollups from the expenses collection"""
+        match = {'user_id': user_id} if user_id is not None else {}
+        count = await self._rebuild_rollups(match)
+        user_ids = [user_id] if user_id is not None else await self.expenses.distinct('user_id')
+        markers = _backfill_markers(user_ids)
+        if markers:
+            await self.rollup_backfills.bulk_write(markers, ordered=False)
+        self._rollups_ready.update(user_id for user_id in user_ids if user_id is not None)
+        return count
+    
+    async def _rebuild_rollups(self, match):
+        """Replace the monthly_rollups matching `match` with ones aggregated from expenses"""
+        await self.monthly_rollups.delete_many(match)
+        await self.expenses.aggregate(_rebuild_pipeline(match)).to_list(None)
+        return await self.monthly_rollups.count_documents(match)
+    
+    async def get_monthly_rollups(self, user_id, start_month=None, end_month=None):
+        """Get a user's monthly rollups ('YYYY-MM' bounds inclusive), oldest first"""
+        await self._ensure_rollups(user_id)
+        query = {'user_id': user_id}
+        if start_month or end_month:
+            query['month'] = {}
+            if start_month:
+                query['month']['$gte'] = start_month
+            if end_month:
+                query['month']['$lte'] = end_month
+        return await self.monthly_rollups.find(query, {'_id': 0}).sort('month', 1).to_list(None)
+    
+    async def get_rollup_summary(self, user_id, start_month=None, end_month=None):
+        """Same shape as get_expense_summary, read from monthly_rollups"""
+        return _combine_rollups(await self.get_monthly_rollups(user_id, start_month, end_month))
+    
+    async def get_budget_actuals(self, user_id, month):
+        """Actual spending per category for a 'YYYY-MM' budget"""
+        await self._ensure_rollups(user_id)
+        rollup = await self.monthly_rollups.find_one({'user_id': user_id, 'month': month}, {'_id': 0})
+        return _budget_actuals(rollup)
+    
+    async def save_task(self, task_data):
+        """Save a task"""
+        task_data['created_at'] = datetime.now()
+        return await self._insert(self.tasks, task_data)
+    
+    def _tasks_cursor(self, user_id, date=None, projection=None):
+        """Cursor for a user's tasks query"""
+        query = {'user_id': user_id}
+        if date:
+            query['date'] = date
+        return self.tasks.find(query, projection).sort('priority', -1)
+    
+    async def get_user_tasks(self, user_id, date=None, fields=None, lean=None):
+        """Get tasks for a user"""
+        cursor = self._tasks_cursor(user_id, date, _projection(fields))
+        return _read_rows(await cursor.to_list(None), fields, lean)
+    
+    async def get_user_finance_profile(self, user_id):
+        """Get user's finance profile"""
+        async def load():
+            profile = await self.db['finance_profiles'].find_one({'user_id': user_id})
+            if profile:
+                profile['_id'] = str(profile['_id'])
+            return profile
+        
+        return await self._cached('finance_profiles', user_id, load)
+    
+    async def update_user_finance_profile(self, user_id, profile_data):
+        """Update or create user's finance profile"""
+        try:
+            result = await self.db['finance_profiles'].update_one(
+                {'user_id': user_id},
+                {'$set': profile_data},
+                upsert=True
+            )
+            self.cache.invalidate(('finance_profiles', user_id))
+            await self.bump_data_version(user_id)
+            return result.acknowledged
+        except Exception as e:
+            print(f"Error updating finance profile: {e}")
+            return False
+    
+    async def get_user_location(self, user_id):
+        """Get user's saved location"""
+        async def load():
+            location = await self.db['user_locations'].find_one({'user_id': user_id})
+            if location:
+                location['_id'] = str(location['_id'])
+            return location
+        
+        return await self._cached('user_locations', user_id, load)
+    
+    async def save_user_location(self, user_id, location_data):
+        """Save or update user's location"""
+        try:
+            result = await self.db['user_locations'].update_one(
+                {'user_id': user_id},
+                {'$set': location_data},
+                upsert=True
+            )
+            self.cache.invalidate(('user_locations', user_id))
+            return result.acknowledged
+        except Exception as e:
+            print(f"Error saving location: {e}")
+            return False
+    
+    def _goals_cursor(self, user_id, projection=None):
+        """Cursor for a user's financial goals query"""
+        return self.db['financial_goals'].find({'user_id': user_id}, projection)
+    
+    async def get_financial_goals(self, user_id, fields=None, lean=None):
+        """Get user's financial goals (full documents are served from the cache)"""
+        if fields is None and lean is None:
+            async def load():
+                return _read_rows(await self._goals_cursor(user_id).to_list(None))
+            
+            return await self._cached('financial_goals', user_id, load)
+        cursor = self._goals_cursor(user_id, _projection(fields))
+        return _read_rows(await cursor.to_list(None), fields, lean)
+    
+    async def add_financial_goal(self, goal_data):
+        """Add a financial goal"""
+        goal_data['created_at'] = datetime.now()
+        result = await self.db['financial_goals'].insert_one(goal_data)
+        self.cache.invalidate(('financial_goals', goal_data.get('user_id')))
+        return result.inserted_id
+    
+    async def add_expense(self, expense_data):
+        """Add an expense - for backwards compatibility"""
+        return await self.save_expense(expense_data)
+    
+    async def get_analysis_inputs(self, user_id, date=None, deadline=None):
+        """
+        Fetch everything /api/analysis/comprehensive needs concurrently
+        
+        Args:
+            date: Only meetings on this date
+            deadline: time.monotonic() value to finish by (raises fanout.DeadlineExceeded)
+        
+        Returns:
+            (user_profile, expense_summary, tasks, meetings) with tasks as
+            (priority,) tuples and meetings as (date,) tuples
+        """
+        reads = asyncio.gather(
+            self.get_user_profile(user_id),
+            self.get_rollup_summary(user_id),
+            self.get_user_tasks(user_id, fields=('priority',), lean='tuples'),
+            self.get_user_meetings(user_id, date, fields=('date',), lean='tuples')
+        )
+        try:
+            return await asyncio.wait_for(reads, _remaining(deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded('analysis inputs did not finish in time')
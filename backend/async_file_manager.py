@@ -0,0 +1,194 @@
+"""
+Asyncio counterpart of FileManager, built on Motor's GridFS bucket
+Files are stored exactly as FileManager stores them, so both can serve the same data
+"""
+
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from mongo_client import get_async_client, get_mongo_uri, get_database_name
+from file_manager import get_file_category
+import os
+import mimetypes
+
+
+def _format_metadata(metadata):
+    """Stringify _id and ISO-format the dates of a files_metadata document"""
+    metadata['_id'] = str(metadata['_id'])
+    metadata['upload_date'] = metadata['upload_date'].isoformat()
+    metadata['last_modified'] = metadata['last_modified'].isoformat()
+    return metadata
+
+
+class AsyncFileManager:
+    """
+    Motor-backed FileManager
+    Handles resolve against the running event loop's client; await
+    ensure_indexes() once at startup.
+    """
+    
+    def __init__(self):
+        """Initialize File Manager settings (the connection opens on first use)"""
+        self.mongo_uri = get_mongo_uri()
+        self.db_name = get_database_name()
+    
+    @property
+    def db(self):
+        return get_async_client(self.mongo_uri)[self.db_name]
+    
+    @property
+    def fs(self):
+        return AsyncIOMotorGridFSBucket(self.db)
+    
+    @property
+    def files_metadata(self):
+        return self.db['files_metadata']
+    
+    async def ensure_indexes(self):
+        """Create indexes for efficient searching"""
+        await self.files_metadata.create_index([('user_id', 1), ('upload_date', -1)])
+        await self.files_metadata.create_index([('user_id', 1), ('file_name', 1)])
+        await self.files_metadata.create_index([('user_id', 1), ('file_type', 1)])
+        await self.files_metadata.create_index([('user_id', 1), ('custom_name', 1)])
+    
+    async def upload_file(self, user_id, file_data, original_filename, custom_name=None):
+        """Upload file to GridFS and store metadata (see FileManager.upload_file)"""
+        file_extension = os.path.splitext(original_filename)[1].lower()
+        mime_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+        file_category = self._get_file_category(file_extension)
+        
+        file_id = await self.fs.upload_from_stream(
+            original_filename,
+            file_data,
+            metadata={'contentType': mime_type, 'user_id': user_id}
+        )
+        
+        metadata = {
+            'user_id': user_id,
+            'file_id': str(file_id),
+            'original_filename': original_filename,
+            'custom_name': custom_name or original_filename,
+            'file_extension': file_extension,
+            'file_type': file_category,
+            'mime_type': mime_type,
+            'file_size': len(file_data),
+            'upload_date': datetime.now(),
+            'last_modified': datetime.now(),
+            'tags': [],
+            'description': ''
+        }
+        
+        result = await self.files_metadata.insert_one(metadata)
+        metadata['_id'] = result.inserted_id
+        return _format_metadata(metadata)
+    
+    def _get_file_category(self, extension):
+        """Categorize file by extension"""
+        return get_file_category(extension)
+    
+    async def get_file(self, file_id):
+        """Retrieve file from GridFS"""
+        try:
+            grid_out = await self.fs.open_download_stream(ObjectId(file_id))
+            data = await grid_out.read()
+            # FileManager stores contentType on the file document, the bucket in metadata
+            content_type = (grid_out.metadata or {}).get('contentType') or grid_out.content_type
+            return data, content_type, grid_out.filename
+        except Exception as e:
+            return None, None, None
+    
+    async def get_file_metadata(self, metadata_id):
+        """Get file metadata by ID"""
+        try:
+            metadata = await self.files_metadata.find_one({'_id': ObjectId(metadata_id)})
+            if metadata:
+                _format_metadata(metadata)
+            return metadata
+        except:
+            return None
+    
+    async def search_files(self, user_id, query=None, file_type=None, start_date=None, end_date=None, sort_by='upload_date', sort_order=-1):
+        """Search files with advanced filters (see FileManager.search_files)"""
+        search_filter = {'user_id': user_id}
+        
+        if query:
+            search_filter['$or'] = [
+                {'original_filename': {'$regex': query, '$options': 'i'}},
+                {'custom_name': {'$regex': query, '$options': 'i'}},
+                {'description': {'$regex': query, '$options': 'i'}},
+                {'tags': {'$regex': query, '$options': 'i'}}
+            ]
+        
+        if file_type:
+            search_filter['file_type'] = file_type
+        
+        if start_date or end_date:
+            date_filter = {}
+            if start_date:
+                date_filter['$gte'] = datetime.fromisoformat(start_date)
+            if end_date:
+                date_filter['$lte'] = datetime.fromisoformat(end_date)
+            if date_filter:
+                search_filter['upload_date'] = date_filter
+        
+        results = await self.files_metadata.find(search_filter).sort(sort_by, sort_order).to_list(None)
+        return [_format_metadata(result) for result in results]
+    
+    async def get_user_files(self, user_id, limit=50, skip=0):
+        """Get all files for a user with pagination"""
+        files = await (
+            self.files_metadata.find({'user_id': user_id})
+            .sort('upload_date', -1)
+            .limit(limit)
+            .skip(skip)
+            .to_list(None)
+        )
+        return [_format_metadata(file) for file in files]
+    
+    async def update_file_metadata(self, metadata_id, updates):
+        """Update file metadata (name, description, tags)"""
+        updates['last_modified'] = datetime.now()
+        
+        result = await self.files_metadata.update_one(
+            {'_id': ObjectId(metadata_id)},
+            {'$set': updates}
+        )
+        
+        return result.modified_count > 0
+    
+    async def delete_file(self, metadata_id):
+        """Delete file and its metadata"""
+        try:
+            metadata = await self.files_metadata.find_one({'_id': ObjectId(metadata_id)})
+            if not metadata:
+                return False
+            
+            await self.fs.delete(ObjectId(metadata['file_id']))
+            await self.files_metadata.delete_one({'_id': ObjectId(metadata_id)})
+            
+            return True
+        except Exception as e:
+            print(f"Error deleting file: {e}")
+            return False
+    
+    async def get_file_statistics(self, user_id):
+        """Get file statistics for user"""
+        pipeline = [
+            {'$match': {'user_id': user_id}},
+            {'$group': {
+                '_id': '$file_type',
+                'count': {'$sum': 1},
+                'total_size': {'$sum': '$file_size'}
+            }}
+        ]
+        
+        stats = await self.files_metadata.aggregate(pipeline).to_list(None)
+        
+        total_files = sum(s['count'] for s in stats)
+        total_size = sum(s['total_size'] for s in stats)
+        
+        return {
+            'total_files': total_files,
+            'total_size': total_size,
+            'by_type': {s['_id']: {'count': s['count'], 'size': s['total_size']} for s in stats}
+        }
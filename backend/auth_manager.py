@@ -1,19 +1,18 @@
 # Authentication module for user management
-from pymongo import MongoClient
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid
 import re
-import os
 from dotenv import load_dotenv
+from mongo_client import get_client
+from id_generator import new_id
 
 load_dotenv()
 
 class AuthManager:
     def __init__(self):
         try:
-            mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-            self.client = MongoClient(mongodb_uri, serverSelectionTimeoutMS=5000)
+            self.client = get_client()
             self.db = self.client['lifepilot_ai']
             self.users_collection = self.db['users']
             
@@ -29,12 +28,12 @@ class AuthManager:
             raise
     
     def generate_user_id(self):
-        """Generate a unique user ID"""
-        return f"LP-{uuid.uuid4().hex[:12].upper()}"
+        """Generate a unique, time-ordered user ID"""
+        return new_id('LP-')
     
     def generate_guest_id(self):
-        """Generate a unique guest ID"""
-        return f"GUEST-{uuid.uuid4().hex[:10].upper()}"
+        """Generate a unique, time-ordered guest ID"""
+        return new_id('GUEST-')
     
     def generate_guest_username(self):
         """Generate a unique guest username"""
@@ -142,7 +141,7 @@ class AuthManager:
                 'email': email,
                 'is_guest': False
             }
-            
+        
         except Exception as e:
             return False, f"Registration error: {str(e)}", None
     
@@ -179,7 +178,7 @@ class AuthManager:
             }
             
             return True, "Login successful", user_data
-            
+        
         except Exception as e:
             return False, f"Login error: {str(e)}", None
     
@@ -203,16 +202,21 @@ class AuthManager:
             return None
     
     def update_user_profile_data(self, user_id, profile_data):
-        """Update user's profile data"""
+        """
+        Update user's profile data
+        Returns: the users document's _id as a string (the id Database reads
+        profiles by), or None if no user was updated
+        """
         try:
-            result = self.users_collection.update_one(
+            user = self.users_collection.find_one_and_update(
                 {'user_id': user_id},
-                {'$set': {'profile_data': profile_data, 'updated_at': datetime.now()}}
+                {'$set': {'profile_data': profile_data, 'updated_at': datetime.now()}},
+                projection={'_id': 1}
             )
-            return result.modified_count > 0
+            return str(user['_id']) if user else None
         except Exception as e:
             print(f"Error updating profile: {str(e)}")
-            return False
+            return None
     
     def validate_user_id(self, user_id):
         """Check if user ID exists"""
@@ -0,0 +1,108 @@
+"""
+In-process LRU cache with per-entry TTL and an approximate memory budget
+"""
+
+import copy
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by TTLCache.get when a key is absent or expired (None is a valid cached value)
+MISSING = object()
+
+
+def approx_size(value):
+    """Rough deep size of a cached value in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+class TTLCache:
+    """Thread-safe LRU + TTL cache, bounded by entry count and bytes"""
+    
+    def __init__(self, max_entries=1024, ttl=300, max_bytes=16 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Maximum number of cached keys
+            ttl: Seconds an entry stays valid
+            max_bytes: Approximate memory budget for all cached values
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Get a copy of the cached value, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[2]
+        # Callers may mutate what they get back (e.g. stringify _id)
+        return copy.deepcopy(value)
+    
+    def set(self, key, value):
+        """Cache a copy of value under key"""
+        value = copy.deepcopy(value)
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+    
+    def invalidate(self, key):
+        """Forget a key (call after writing the underlying data)"""
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+    
+    def clear(self):
+        """Forget everything"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def _drop(self, key):
+        """Remove an entry (caller holds the lock)"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def stats(self):
+        """Hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -3,7 +3,108 @@ import pandas as pd
 from datetime import datetime, timedelta
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
+from concurrent.futures import ProcessPoolExecutor
 import os
+from forecasting import dense_months, forecast_monthly, forecast_series, month_index
+from fanout import run_concurrently
+
+# Expense fields the spending and prediction analyses read; pass these to
+# Database.get_user_expenses(fields=..., lean='columns') to skip the rest
+SPENDING_FIELDS = ('amount', 'category', 'date')
+
+
+# Histories up to this many rows skip pandas (DataFrame setup dominates at this size)
+SPENDING_NUMPY_MAX_ROWS = 20000
+
+# Long-format columns UserDataAnalyzer.analyze_cohort reads
+COHORT_FIELDS = ('user_id',) + SPENDING_FIELDS
+
+# Fewer users than this per process are analyzed in-process (pickling would dominate)
+COHORT_MIN_USERS_PER_WORKER = 5000
+
+
+def _row_count(records):
+    """Number of rows in a list of records or a columnar {field: [values]} dict"""
+    if isinstance(records, dict):
+        return len(next(iter(records.values()), []))
+    return len(records)
+
+
+def _spending_columns(records):
+    """(amounts, categories, dates) lists from records or a columnar dict"""
+    if isinstance(records, dict):
+        return records.get('amount'), records.get('category'), records.get('date')
+    return (
+        [record.get('amount') for record in records],
+        [record.get('category') for record in records],
+        [record.get('date') for record in records]
+    )
+
+
+def _spending_kernel(records):
+    """
+    DataFrame-free version of the steps in analyze_spending_patterns
+    
+    Returns:
+        (category_spending, total_spending, date_range), or None when the input
+        holds anything but numeric amounts, str/None categories and 'YYYY-MM-DD'
+        dates, so the caller can fall back to pandas for its exact semantics
+    """
+    amounts, categories, dates = _spending_columns(records)
+    if amounts is None or categories is None or dates is None:
+        return None
+    
+    amounts = np.asarray(amounts)
+    if amounts.dtype.kind not in 'if' or (amounts.dtype.kind == 'f' and np.isnan(amounts).any()):
+        return None
+    
+    # Factorize once; codes follow first appearance, keys are sorted afterwards like groupby
+    index = {}
+    codes = []
+    for category in categories:
+        if category is None:
+            codes.append(-1)  # groupby drops missing keys
+        elif type(category) is str:
+            codes.append(index.setdefault(category, len(index)))
+        else:
+            return None
+    
+    if not all(type(value) is str and len(value) == 10 for value in dates):
+        return None
+    try:
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    except ValueError:
+        return None
+    
+    # groupby().sum() adds floats with Kahan compensation; a plain np.bincount
+    # drifts from it in the last bit, enough to flip a rounded figure, so the
+    # same compensated loop runs here (ints stay exact: compensation stays 0)
+    sums = [0] * len(index)
+    compensation = [0] * len(index)
+    for code, amount in zip(codes, amounts.tolist()):
+        if code < 0:
+            continue
+        y = amount - compensation[code]
+        t = sums[code] + y
+        c = t - sums[code] - y
+        compensation[code] = c if c == c else 0  # inf amounts make c NaN
+        sums[code] = t
+    category_spending = {category: sums[index[category]] for category in sorted(index)}
+    
+    date_range = int(days.max() - days.min()) or 1
+    return category_spending, amounts.sum(), date_range
+
+
+def _segment_bounds(sorted_codes, count):
+    """Start/end offsets of codes 0..count-1 in an ascending code array"""
+    bounds = np.searchsorted(sorted_codes, np.arange(count + 1))
+    return bounds[:-1], bounds[1:]
+
+
+def _analyze_cohort_shard(frame):
+    """Process pool entry point for UserDataAnalyzer.analyze_cohort"""
+    return UserDataAnalyzer()._analyze_cohort_frame(frame)
+
 
 class UserDataAnalyzer:
     """
@@ -11,8 +112,24 @@ class UserDataAnalyzer:
     Analyzes spending patterns, routine optimization, and provides personalized insights
     """
     
-    def __init__(self):
+    # Spending thresholds as % of total (industry standards)
+    SPENDING_THRESHOLDS = {
+        'Food': 25,
+        'Transport': 15,
+        'Shopping': 10,
+        'Bills': 30,
+        'Entertainment': 10,
+        'Health': 10,
+        'Education': 10
+    }
+    
+    def __init__(self, forecast_cache=None):
+        """
+        Args:
+            forecast_cache: Per-user cache of fitted forecast parameters (see forecasting)
+        """
         self.scaler = StandardScaler()
+        self.forecast_cache = forecast_cache
     
     def analyze_user_profile(self, user_data):
         """
@@ -86,13 +203,15 @@ class UserDataAnalyzer:
     def analyze_spending_patterns(self, expenses):
         """
         Analyze spending patterns using ML clustering
+        Accepts a list of expense dicts or a columnar dict of SPENDING_FIELDS
         """
-        if not expenses or len(expenses) < 3:
-            return {
-                'status': 'insufficient_data',
-                'message': 'Need more expense data for analysis (minimum 3 entries)',
-                'suggestions': ['Track your expenses daily', 'Categorize all transactions']
-            }
+        if not expenses or _row_count(expenses) < 3:
+            return self._insufficient_spending_data()
+        
+        if _row_count(expenses) <= SPENDING_NUMPY_MAX_ROWS:
+            result = _spending_kernel(expenses)
+            if result is not None:
+                return self._summarize_spending(*result)
         
         # Convert expenses to DataFrame
         df = pd.DataFrame(expenses)
@@ -101,6 +220,45 @@ class UserDataAnalyzer:
         category_spending = df.groupby('category')['amount'].sum().to_dict()
         total_spending = df['amount'].sum()
         
+        # Trend analysis
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.sort_values('date')
+        
+        # Calculate daily average
+        date_range = (df['date'].max() - df['date'].min()).days or 1
+        
+        return self._summarize_spending(category_spending, total_spending, date_range)
+    
+    def analyze_spending_summary(self, summary):
+        """
+        Analyze spending patterns from pre-aggregated totals
+        (Database.get_expense_summary), without fetching the expense history
+        """
+        if summary.get('count', 0) < 3:
+            return self._insufficient_spending_data()
+        
+        # Uncategorised expenses count towards the total only, as in the DataFrame path
+        category_spending = {
+            cat: totals['total']
+            for cat, totals in sorted((k, v) for k, v in summary['categories'].items() if k is not None)
+        }
+        
+        first_date = pd.to_datetime(summary['first_date'])
+        last_date = pd.to_datetime(summary['last_date'])
+        date_range = (last_date - first_date).days or 1
+        
+        return self._summarize_spending(category_spending, summary['total'], date_range)
+    
+    def _insufficient_spending_data(self):
+        """Response for histories too short to analyze"""
+        return {
+            'status': 'insufficient_data',
+            'message': 'Need more expense data for analysis (minimum 3 entries)',
+            'suggestions': ['Track your expenses daily', 'Categorize all transactions']
+        }
+    
+    def _summarize_spending(self, category_spending, total_spending, date_range):
+        """Build the spending analysis from category totals and the date span in days"""
         # Calculate percentages
         category_percentages = {
             cat: (amount / total_spending * 100) 
@@ -112,15 +270,7 @@ class UserDataAnalyzer:
         overspending_categories = []
         
         # Spending thresholds (industry standards)
-        thresholds = {
-            'Food': 25,
-            'Transport': 15,
-            'Shopping': 10,
-            'Bills': 30,
-            'Entertainment': 10,
-            'Health': 10,
-            'Education': 10
-        }
+        thresholds = self.SPENDING_THRESHOLDS
         
         for category, percentage in category_percentages.items():
             threshold = thresholds.get(category, 15)
@@ -135,12 +285,6 @@ class UserDataAnalyzer:
                     'priority': 'high' if percentage > threshold * 1.5 else 'medium'
                 })
         
-        # Trend analysis
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
-        
-        # Calculate daily average
-        date_range = (df['date'].max() - df['date'].min()).days or 1
         daily_average = total_spending / date_range
         
         return {
@@ -232,15 +376,14 @@ class UserDataAnalyzer:
         else:
             return 'Overloaded'
     
-    def predict_monthly_expenses(self, expenses_history):
+    def predict_monthly_expenses(self, expenses_history, user_id=None):
         """
         Predict next month's expenses using historical data
+        Accepts a list of expense dicts or a columnar dict of SPENDING_FIELDS;
+        user_id keys the forecast parameter cache
         """
-        if not expenses_history or len(expenses_history) < 10:
-            return {
-                'status': 'insufficient_data',
-                'message': 'Need at least 10 expense records for prediction'
-            }
+        if not expenses_history or _row_count(expenses_history) < 10:
+            return self._insufficient_prediction_data()
         
         df = pd.DataFrame(expenses_history)
         df['date'] = pd.to_datetime(df['date'])
@@ -249,26 +392,172 @@ class UserDataAnalyzer:
         df['month'] = df['date'].dt.to_period('M')
         monthly_totals = df.groupby('month')['amount'].sum()
         
-        # Simple trend analysis
+        return self._predict_from_monthly_totals(monthly_totals, user_id)
+    
+    def predict_monthly_expenses_summary(self, summary, user_id=None):
+        """
+        Predict next month's expenses from pre-aggregated monthly totals
+        (Database.get_expense_summary)
+        """
+        if summary.get('count', 0) < 10:
+            return self._insufficient_prediction_data()
+        
+        monthly_totals = pd.Series(summary['monthly_totals'], dtype=float).sort_index()
+        return self._predict_from_monthly_totals(monthly_totals, user_id)
+    
+    def _insufficient_prediction_data(self):
+        """Response for histories too short to predict from"""
+        return {
+            'status': 'insufficient_data',
+            'message': 'Need at least 10 expense records for prediction'
+        }
+    
+    def _predict_from_monthly_totals(self, monthly_totals, user_id=None):
+        """Project next month from a Series of monthly totals indexed by Period or 'YYYY-MM'"""
         if len(monthly_totals) >= 2:
-            trend = monthly_totals.pct_change().mean() * 100
-            last_month_total = monthly_totals.iloc[-1]
-            predicted_next_month = last_month_total * (1 + trend / 100)
-            
-            return {
-                'status': 'predicted',
-                'last_month_total': round(last_month_total, 2),
-                'predicted_next_month': round(predicted_next_month, 2),
-                'trend_percentage': round(trend, 2),
-                'trend_direction': 'increasing' if trend > 0 else 'decreasing',
-                'confidence': 'medium' if len(monthly_totals) < 6 else 'high'
-            }
+            series = dense_months([month_index(month) for month in monthly_totals.index], monthly_totals.to_numpy())
+            forecast = forecast_series(series, key=user_id, cache=self.forecast_cache)
+            return self._prediction_from_forecast(series, forecast)
         
+        return self._insufficient_months()
+    
+    def _insufficient_months(self):
+        """Response for histories spanning a single month"""
         return {
             'status': 'insufficient_data',
             'message': 'Need at least 2 months of data'
         }
     
+    def _prediction_from_forecast(self, series, forecast):
+        """
+        Prediction response for a gap-free monthly series and its forecasting result
+        The trend is the model's monthly trend as a percentage of the average month,
+        which stays finite when a month's total is near zero
+        """
+        average = series.mean()
+        trend = forecast['trend'] / average * 100 if average > 0 else 0.0
+        
+        return {
+            'status': 'predicted',
+            'last_month_total': round(float(series[-1]), 2),
+            'predicted_next_month': forecast['forecast'],
+            'trend_percentage': round(trend, 2),
+            'trend_direction': 'increasing' if trend > 0 else 'decreasing',
+            'confidence': 'medium' if len(series) < 6 else 'high',
+            'forecast': forecast
+        }
+    
+    def analyze_cohort(self, frame, workers=None):
+        """
+        Spending analysis and next-month prediction for many users in one pass
+        
+        Args:
+            frame: Long-format DataFrame (or anything pd.DataFrame accepts) with
+                user_id, date, category and amount columns
+            workers: Shard users across this many processes (None or 1 runs in-process)
+        
+        Returns:
+            {user_id: {'spending_analysis': {...}, 'prediction': {...}}} in first-seen
+            order; each entry is what analyze_spending_patterns and
+            predict_monthly_expenses return for that user's rows
+        """
+        df = frame if isinstance(frame, pd.DataFrame) else pd.DataFrame(frame)
+        missing = [field for field in COHORT_FIELDS if field not in df.columns]
+        if missing:
+            raise ValueError(f"Cohort frame is missing columns: {', '.join(missing)}")
+        df = df[list(COHORT_FIELDS)]
+        
+        if workers and workers > 1:
+            user_codes, users = pd.factorize(df['user_id'])
+            shards = min(workers, len(users) // COHORT_MIN_USERS_PER_WORKER)
+            if shards > 1:
+                # Contiguous code ranges keep the merged result in first-seen order
+                edges = np.linspace(0, len(users), shards + 1).astype(np.int64)
+                frames = [df[(user_codes >= lo) & (user_codes < hi)] for lo, hi in zip(edges[:-1], edges[1:])]
+                results = {}
+                with ProcessPoolExecutor(max_workers=shards) as pool:
+                    for shard_result in pool.map(_analyze_cohort_shard, frames):
+                        results.update(shard_result)
+                return results
+        
+        return self._analyze_cohort_frame(df)
+    
+    def _analyze_cohort_frame(self, df):
+        """analyze_cohort for one shard: grouped pandas/NumPy reductions, then per-user assembly"""
+        user_codes, users = pd.factorize(df['user_id'])
+        keep = user_codes >= 0  # rows without a user_id
+        df = df[keep].reset_index(drop=True)
+        user_codes = user_codes[keep]
+        user_count = len(users)
+        if not user_count:
+            return {}
+        
+        dates = pd.to_datetime(df['date'])
+        rows_per_user = np.bincount(user_codes, minlength=user_count)
+        
+        # A stable sort keeps each user's rows in input order, as the per-user methods see them
+        order = np.argsort(user_codes, kind='stable')
+        amounts = df['amount'].to_numpy()[order]
+        row_start, row_end = _segment_bounds(user_codes[order], user_count)
+        
+        # Grouped sums add each group's rows in input order, like the per-user groupby
+        by_category = df['amount'].groupby([user_codes, df['category']]).sum()
+        category_codes = by_category.index.get_level_values(0).to_numpy()
+        category_names = by_category.index.get_level_values(1).tolist()
+        category_totals = by_category.tolist()
+        category_start, category_end = _segment_bounds(category_codes, user_count)
+        
+        by_month = df['amount'].groupby([user_codes, dates.dt.to_period('M')]).sum()
+        month_codes = by_month.index.get_level_values(0).to_numpy()
+        months = by_month.index.get_level_values(1)
+        month_numbers = months.year.to_numpy() * 12 + months.month.to_numpy() - 1
+        month_totals = by_month.to_numpy()
+        month_start, month_end = _segment_bounds(month_codes, user_count)
+        
+        # One vectorized forecast for every user with enough history
+        user_list = users.tolist()
+        forecast_codes = [
+            code for code in range(user_count)
+            if rows_per_user[code] >= 10 and month_end[code] - month_start[code] >= 2
+        ]
+        series = {
+            code: dense_months(month_numbers[month_start[code]:month_end[code]],
+                               month_totals[month_start[code]:month_end[code]])
+            for code in forecast_codes
+        }
+        forecasts = dict(zip(forecast_codes, forecast_monthly(
+            [series[code] for code in forecast_codes],
+            keys=[user_list[code] for code in forecast_codes],
+            cache=self.forecast_cache
+        )))
+        
+        spans = dates.groupby(user_codes).agg(['min', 'max'])
+        date_ranges = (spans['max'] - spans['min']).dt.days.reindex(range(user_count)).tolist()
+        
+        results = {}
+        for code, user_id in enumerate(user_list):
+            rows = rows_per_user[code]
+            if rows < 3:
+                spending_analysis = self._insufficient_spending_data()
+            else:
+                lo, hi = category_start[code], category_end[code]
+                category_spending = dict(zip(category_names[lo:hi], category_totals[lo:hi]))
+                spending_analysis = self._summarize_spending(
+                    category_spending,
+                    amounts[row_start[code]:row_end[code]].sum(),
+                    date_ranges[code] or 1
+                )
+            
+            if rows < 10:
+                prediction = self._insufficient_prediction_data()
+            elif code in forecasts:
+                prediction = self._prediction_from_forecast(series[code], forecasts[code])
+            else:
+                prediction = self._insufficient_months()
+            
+            results[user_id] = {'spending_analysis': spending_analysis, 'prediction': prediction}
+        return results
+    
     def _get_age_group(self, age):
         """Categorize age into groups"""
         if isinstance(age, str):
@@ -309,13 +598,30 @@ class UserDataAnalyzer:
         else:
             return 'Large Family'
     
-    def generate_personalized_insights(self, user_data, expenses, tasks, meetings):
+    def generate_personalized_insights(self, user_data, expenses, tasks, meetings, spending_analysis=None,
+                                       expense_summary=None, concurrent=False, deadline=None):
         """
         Generate comprehensive personalized insights
+        Pass a precomputed spending_analysis (e.g. from a SpendingAccumulator)
+        or a rollup expense_summary to skip analysing `expenses` here. With
+        concurrent=True the profile, spending and routine analyses run at once on
+        the shared fan-out pool, raising fanout.DeadlineExceeded past `deadline`
         """
-        profile_analysis = self.analyze_user_profile(user_data)
-        spending_analysis = self.analyze_spending_patterns(expenses)
-        routine_analysis = self.optimize_routine(user_data, tasks, meetings)
+        if spending_analysis is not None:
+            analyze_spending = lambda: spending_analysis
+        elif expense_summary is not None:
+            analyze_spending = lambda: self.analyze_spending_summary(expense_summary)
+        else:
+            analyze_spending = lambda: self.analyze_spending_patterns(expenses)
+        analyses = [
+            lambda: self.analyze_user_profile(user_data),
+            analyze_spending,
+            lambda: self.optimize_routine(user_data, tasks, meetings)
+        ]
+        if concurrent:
+            profile_analysis, spending_analysis, routine_analysis = run_concurrently(analyses, deadline)
+        else:
+            profile_analysis, spending_analysis, routine_analysis = (analysis() for analysis in analyses)
         
         # Generate AI insights
         insights = {
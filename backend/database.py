@@ -1,14 +1,353 @@
-from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from mongo_client import get_client, get_mongo_uri, get_database_name
+from write_buffer import WriteBehindBuffer
+from cache import TTLCache, MISSING
+from spending_accumulator import SpendingAccumulator, accumulator_updates
+from fanout import run_concurrently
+from field_keys import encode_key, decode_keys, encode_key_expr
+import logging
 import os
 
+logger = logging.getLogger('lifepilot.database')
+
+# Declarative index manifest: collection -> [(keys, options)]
+# Each entry backs one of the Database.get_* query shapes below
+INDEXES = {
+    'expenses': [
+        ([('user_id', 1), ('date', -1)], {}),
+    ],
+    'meetings': [
+        ([('user_id', 1), ('date', 1)], {}),
+    ],
+    'tasks': [
+        ([('user_id', 1), ('priority', -1)], {}),
+        ([('user_id', 1), ('date', 1), ('priority', -1)], {}),
+    ],
+    'routines': [
+        ([('user_id', 1)], {}),
+    ],
+    'finance_profiles': [
+        ([('user_id', 1)], {'unique': True}),
+    ],
+    'user_locations': [
+        ([('user_id', 1)], {'unique': True}),
+    ],
+    'financial_goals': [
+        ([('user_id', 1)], {}),
+    ],
+    'monthly_rollups': [
+        ([('user_id', 1), ('month', 1)], {'unique': True}),
+    ],
+    'spending_accumulators': [
+        ([('user_id', 1)], {'unique': True}),
+    ],
+}
+
+
+# Documents fetched per round trip by iter_user_expenses
+EXPENSE_BATCH_SIZE = 500
+
+# Works for 'YYYY-MM-DD' strings and BSON dates alike
+MONTH_KEY_EXPR = {'$substrBytes': [{'$toString': '$date'}, 0, 7]}
+
+# Row shapes accepted by the get_* readers besides the default list of dicts
+LEAN_MODES = ('tuples', 'columns')
+
+
+def _projection(fields):
+    """Build a find() projection for the requested fields"""
+    if not fields:
+        return None
+    projection = {field: 1 for field in fields}
+    if '_id' not in projection:
+        projection['_id'] = 0
+    return projection
+
+
+def _read_rows(cursor, fields=None, lean=None):
+    """
+    Materialise a cursor
+    
+    lean=None returns dicts with stringified _id, 'tuples' returns one tuple
+    per document in `fields` order and 'columns' returns {field: [values]}.
+    Lean rows are built straight from the cursor without _id conversion.
+    """
+    if lean is None:
+        rows = list(cursor)
+        for row in rows:
+            if '_id' in row:
+                row['_id'] = str(row['_id'])
+        return rows
+    
+    if lean not in LEAN_MODES:
+        raise ValueError(f"lean must be one of: {', '.join(LEAN_MODES)}")
+    if not fields:
+        raise ValueError("lean mode requires fields")
+    
+    if lean == 'tuples':
+        return [tuple(doc.get(field) for field in fields) for doc in cursor]
+    
+    columns = {field: [] for field in fields}
+    appenders = [(field, columns[field].append) for field in fields]
+    for doc in cursor:
+        for field, append in appenders:
+            append(doc.get(field))
+    return columns
+
+
+def _month_key(date):
+    """'YYYY-MM' for a 'YYYY-MM-DD' string or datetime, None if unknown"""
+    if isinstance(date, datetime):
+        return date.strftime('%Y-%m')
+    if isinstance(date, str) and len(date) >= 7:
+        return date[:7]
+    return None
+
+
+def _rollup_updates(expenses):
+    """Group expenses into one $inc upsert per (user_id, month) rollup document"""
+    rollups = {}
+    for expense in expenses:
+        user_id = expense.get('user_id')
+        month = _month_key(expense.get('date'))
+        if user_id is None or month is None:
+            continue
+        
+        rollup = rollups.setdefault((user_id, month), {
+            'inc': {'total': 0, 'count': 0}, 'first_date': None, 'last_date': None
+        })
+        amount = expense.get('amount', 0)
+        amount = amount if isinstance(amount, (int, float)) else 0  # $sum skips non-numbers too
+        inc = rollup['inc']
+        inc['total'] += amount
+        inc['count'] += 1
+        
+        category = expense.get('category')
+        if category is not None:
+            key = encode_key(category)
+            inc[f'categories.{key}'] = inc.get(f'categories.{key}', 0) + amount
+            inc[f'category_counts.{key}'] = inc.get(f'category_counts.{key}', 0) + 1
+        
+        date = expense['date']
+        if rollup['first_date'] is None or date < rollup['first_date']:
+            rollup['first_date'] = date
+        if rollup['last_date'] is None or date > rollup['last_date']:
+            rollup['last_date'] = date
+    
+    now = datetime.now()
+    return [
+        UpdateOne(
+            {'user_id': user_id, 'month': month},
+            {
+                '$inc': rollup['inc'],
+                '$min': {'first_date': rollup['first_date']},
+                '$max': {'last_date': rollup['last_date']},
+                '$set': {'updated_at': now}
+            },
+            upsert=True
+        )
+        for (user_id, month), rollup in rollups.items()
+    ]
+
+
+# Collections whose writes change a user's data version (see Database.bump_data_version)
+VERSIONED_COLLECTIONS = ('expenses', 'tasks', 'meetings')
+
+
+def _version_updates(user_ids):
+    """UpdateOne operations incrementing data_versions for each distinct user"""
+    now = datetime.now()
+    return [
+        UpdateOne({'_id': user_id}, {'$inc': {'version': 1}, '$set': {'updated_at': now}}, upsert=True)
+        for user_id in sorted({str(user_id) for user_id in user_ids if user_id is not None})
+    ]
+
+
+def _summary_pipeline(query):
+    """$facet pipeline behind get_expense_summary"""
+    return [
+        {'$match': query},
+        {'$facet': {
+            'overall': [{'$group': {
+                '_id': None,
+                'total': {'$sum': '$amount'},
+                'count': {'$sum': 1},
+                'first_date': {'$min': '$date'},
+                'last_date': {'$max': '$date'}
+            }}],
+            'categories': [{'$group': {
+                '_id': '$category',
+                'total': {'$sum': '$amount'},
+                'count': {'$sum': 1}
+            }}],
+            'months': [
+                {'$group': {'_id': MONTH_KEY_EXPR, 'total': {'$sum': '$amount'}}},
+                {'$sort': {'_id': 1}}
+            ]
+        }}
+    ]
+
+
+def _summary_from_facets(result):
+    """Shape a _summary_pipeline result as an expense summary"""
+    overall = (result.get('overall') or [{}])[0]
+    return {
+        'total': overall.get('total', 0),
+        'count': overall.get('count', 0),
+        'first_date': overall.get('first_date'),
+        'last_date': overall.get('last_date'),
+        'categories': {
+            row['_id']: {'total': row['total'], 'count': row['count']}
+            for row in result.get('categories', [])
+        },
+        'monthly_totals': {row['_id']: row['total'] for row in result.get('months', [])}
+    }
+
+
+def _rebuild_pipeline(match):
+    """$group/$merge pipeline behind rebuild_monthly_rollups"""
+    category_key = encode_key_expr({'$toString': '$_id.category'})
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'month': MONTH_KEY_EXPR, 'category': '$category'},
+            'total': {'$sum': '$amount'},
+            'count': {'$sum': 1},
+            'first_date': {'$min': '$date'},
+            'last_date': {'$max': '$date'}
+        }},
+        {'$group': {
+            '_id': {'user_id': '$_id.user_id', 'month': '$_id.month'},
+            'total': {'$sum': '$total'},
+            'count': {'$sum': '$count'},
+            'first_date': {'$min': '$first_date'},
+            'last_date': {'$max': '$last_date'},
+            'categories': {'$push': {'k': category_key, 'v': '$total'}},
+            'category_counts': {'$push': {'k': category_key, 'v': '$count'}}
+        }},
+        {'$match': {'_id.user_id': {'$ne': None}, '_id.month': {'$ne': ''}}},
+        {'$project': {
+            '_id': 0,
+            'user_id': '$_id.user_id',
+            'month': '$_id.month',
+            'total': 1,
+            'count': 1,
+            'first_date': 1,
+            'last_date': 1,
+            'categories': {'$arrayToObject': {
+                '$filter': {'input': '$categories', 'cond': {'$ne': ['$$this.k', None]}}
+            }},
+            'category_counts': {'$arrayToObject': {
+                '$filter': {'input': '$category_counts', 'cond': {'$ne': ['$$this.k', None]}}
+            }},
+            'updated_at': '$$NOW'
+        }},
+        {'$merge': {
+            'into': 'monthly_rollups',
+            'on': ['user_id', 'month'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+# Seconds after which another process may take over a user's unfinished rollup backfill
+ROLLUP_BACKFILL_TIMEOUT = 300
+
+
+def _backfill_markers(user_ids):
+    """Upserts recording that each user's monthly_rollups were built from their expenses"""
+    now = datetime.now()
+    return [
+        UpdateOne({'_id': user_id}, {'$set': {'state': 'ready'}, '$setOnInsert': {'created_at': now}}, upsert=True)
+        for user_id in user_ids if user_id is not None
+    ]
+
+
+def _combine_rollups(rollups):
+    """Fold monthly rollup documents into the get_expense_summary shape"""
+    summary = {
+        'total': 0, 'count': 0, 'first_date': None, 'last_date': None,
+        'categories': {}, 'monthly_totals': {}
+    }
+    for rollup in rollups:
+        summary['total'] += rollup.get('total', 0)
+        summary['count'] += rollup.get('count', 0)
+        summary['monthly_totals'][rollup['month']] = rollup.get('total', 0)
+        if summary['first_date'] is None or rollup['first_date'] < summary['first_date']:
+            summary['first_date'] = rollup['first_date']
+        if summary['last_date'] is None or rollup['last_date'] > summary['last_date']:
+            summary['last_date'] = rollup['last_date']
+        
+        counts = decode_keys(rollup.get('category_counts', {}))
+        for category, total in decode_keys(rollup.get('categories', {})).items():
+            totals = summary['categories'].setdefault(category, {'total': 0, 'count': 0})
+            totals['total'] += total
+            totals['count'] += counts.get(category, 0)
+    return summary
+
+
+def _budget_actuals(rollup):
+    """Budget actuals from one monthly rollup document (or None)"""
+    if not rollup:
+        return {'total_expenses': 0, 'actual_spending': {}}
+    return {
+        'total_expenses': rollup.get('total', 0),
+        'actual_spending': decode_keys(rollup.get('categories', {}))
+    }
+
+
+def _plan_stages(plan):
+    """Collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def _plan_indexes(plan):
+    """Collect index names used by an explain() plan tree"""
+    names = []
+    if isinstance(plan, dict):
+        if plan.get('indexName'):
+            names.append(plan['indexName'])
+        for value in plan.values():
+            names.extend(_plan_indexes(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            names.extend(_plan_indexes(item))
+    return names
+
+
+def _plan_report(name, collection_name, explain):
+    """audit_query_plans entry for one query's explain() output"""
+    plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+    stages = _plan_stages(plan)
+    return {
+        'query': name,
+        'collection': collection_name,
+        'stages': stages,
+        'indexes': _plan_indexes(plan),
+        'index_backed': 'COLLSCAN' not in stages,
+        'blocking_sort': 'SORT' in stages
+    }
+
+
 class Database:
     def __init__(self):
         """Initialize MongoDB connection"""
-        self.mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-        self.db_name = os.getenv('DATABASE_NAME', 'lifepilot_ai')
-        self.client = MongoClient(self.mongo_uri)
+        self.mongo_uri = get_mongo_uri()
+        self.db_name = get_database_name()
+        self.client = get_client(self.mongo_uri)
         self.db = self.client[self.db_name]
         
         # Collections
@@ -17,6 +356,153 @@ class Database:
         self.meetings = self.db['meetings']
         self.expenses = self.db['expenses']
         self.tasks = self.db['tasks']
+        self.monthly_rollups = self.db['monthly_rollups']
+        self.data_versions = self.db['data_versions']  # _id: user_id, version: writes so far
+        self.spending_accumulators = self.db['spending_accumulators']
+        self.rollup_backfills = self.db['rollup_backfills']  # _id: user_id whose rollups cover all expenses
+        self._rollups_ready = set()  # users known to have a rollup_backfills marker
+        
+        # Create indexes
+        self._create_indexes()
+        
+        # Read-through cache for rarely changing per-user documents
+        # (profile, finance profile, location, goals); writes invalidate it
+        self.cache = TTLCache(
+            max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 4096)),
+            ttl=float(os.getenv('CACHE_TTL_SECONDS', 300)),
+            max_bytes=int(os.getenv('CACHE_MAX_BYTES', 16 * 1024 * 1024))
+        )
+        
+        # Opt-in write-behind buffering for expenses, tasks and meetings
+        self.write_buffer = None
+        if os.getenv('WRITE_BEHIND_ENABLED', '').lower() in ('1', 'true', 'yes'):
+            self.enable_write_behind()
+    
+    def enable_write_behind(self, max_batch=None, max_delay=None):
+        """
+        Buffer save_expense / save_task / save_meeting inserts into insert_many batches
+        Buffered documents become readable once flushed (batch full, max_delay
+        elapsed, flush_writes() or process exit)
+        """
+        if self.write_buffer is None:
+            self.write_buffer = WriteBehindBuffer(
+                self.db,
+                max_batch=max_batch or int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 500)),
+                max_delay=max_delay or float(os.getenv('WRITE_BEHIND_MAX_DELAY', 1.0)),
+                on_flush=self._after_insert
+            )
+        return self.write_buffer
+    
+    def flush_writes(self):
+        """
+        Write out buffered inserts
+        
+        Returns:
+            {'inserted': {collection: [ids]}, 'pending': documents still queued for a retry,
+             'failed': documents rejected so far, 'last_error': {...} or None}
+        """
+        if self.write_buffer is None:
+            return {'inserted': {}, 'pending': 0, 'failed': 0, 'last_error': None}
+        return self._flush_report(self.write_buffer.flush())
+    
+    def close(self):
+        """Flush buffered inserts (call on shutdown); returns the flush_writes report"""
+        if self.write_buffer is None:
+            return {'inserted': {}, 'pending': 0, 'failed': 0, 'last_error': None}
+        return self._flush_report(self.write_buffer.close())
+    
+    def _flush_report(self, inserted):
+        """flush_writes report for the ids one flush wrote"""
+        status = self.write_buffer.status()
+        return {
+            'inserted': inserted,
+            'pending': status['pending'],
+            'failed': status['failed'],
+            'last_error': status['last_error']
+        }
+    
+    def _cached(self, collection_name, user_id, loader):
+        """Serve (collection, user) reads from the cache, loading on a miss"""
+        key = (collection_name, user_id)
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = loader()
+            self.cache.set(key, value)
+        return value
+    
+    def _insert(self, collection, document):
+        """Insert one document, through the write-behind buffer when enabled"""
+        if self.write_buffer is not None:
+            return self.write_buffer.add(collection.name, document)
+        inserted_id = collection.insert_one(document).inserted_id
+        self._after_insert(collection.name, [document])
+        return inserted_id
+    
+    def _after_insert(self, collection_name, documents):
+        """Maintain derived data once documents are actually written"""
+        if collection_name == 'expenses':
+            self._apply_rollups(documents)
+            self._apply_accumulators(documents)
+        if collection_name in VERSIONED_COLLECTIONS:
+            self.bump_data_version(document.get('user_id') for document in documents)
+    
+    def bump_data_version(self, user_ids):
+        """
+        Increment the data version of each user (one id or an iterable of ids)
+        Results cached under an older version are never served again
+        """
+        updates = _version_updates([user_ids] if isinstance(user_ids, str) else user_ids)
+        if not updates:
+            return
+        try:
+            self.data_versions.bulk_write(updates, ordered=False)
+        except Exception:
+            logger.exception('Error updating data versions')
+    
+    def get_data_version(self, user_id):
+        """Current data version of a user (0 before any tracked write)"""
+        document = self.data_versions.find_one({'_id': str(user_id)}, {'version': 1})
+        return document['version'] if document else 0
+    
+    def _create_indexes(self):
+        """Apply the index manifest (ignore indexes that already exist)"""
+        for collection_name, indexes in INDEXES.items():
+            for keys, options in indexes:
+                try:
+                    self.db[collection_name].create_index(keys, **options)
+                except Exception as e:
+                    print(f"Index creation warning ({collection_name}): {e}")
+    
+    def _query_shapes(self, user_id):
+        """Cursors for every Database.get_* query, used by the plan audit"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        return [
+            ('get_user_profile', 'users', self.users.find({'_id': ObjectId()}).limit(1)),
+            ('get_user_routines', 'routines', self._routines_cursor(user_id)),
+            ('get_user_meetings', 'meetings', self._meetings_cursor(user_id)),
+            ('get_user_meetings(date)', 'meetings', self._meetings_cursor(user_id, today)),
+            ('get_user_expenses', 'expenses', self._expenses_cursor(user_id)),
+            ('get_user_expenses(range)', 'expenses', self._expenses_cursor(user_id, today, today)),
+            ('get_user_tasks', 'tasks', self._tasks_cursor(user_id)),
+            ('get_user_tasks(date)', 'tasks', self._tasks_cursor(user_id, today)),
+            ('get_user_finance_profile', 'finance_profiles',
+             self.db['finance_profiles'].find({'user_id': user_id}).limit(1)),
+            ('get_user_location', 'user_locations',
+             self.db['user_locations'].find({'user_id': user_id}).limit(1)),
+            ('get_financial_goals', 'financial_goals', self._goals_cursor(user_id)),
+        ]
+    
+    def audit_query_plans(self, user_id='__plan_audit__'):
+        """
+        Run explain() on each get_* query and flag plans that are not index-backed
+        
+        Returns:
+            List of {query, collection, stages, indexes, index_backed, blocking_sort}
+        """
+        return [
+            _plan_report(name, collection_name, cursor.explain())
+            for name, collection_name, cursor in self._query_shapes(user_id)
+        ]
     
     def save_user_profile(self, user_data):
         """Save or update user profile"""
@@ -26,15 +512,25 @@ class Database:
             user_data['created_at'] = datetime.now()
         
         result = self.users.insert_one(user_data)
+        self.cache.invalidate(('users', str(result.inserted_id)))
+        self.bump_data_version(str(result.inserted_id))
         return result.inserted_id
     
     def get_user_profile(self, user_id):
         """Get user profile by ID"""
         try:
-            user = self.users.find_one({'_id': ObjectId(user_id)})
+            object_id = ObjectId(user_id)
+        except:
+            return None
+        
+        def load():
+            user = self.users.find_one({'_id': object_id})
             if user:
                 user['_id'] = str(user['_id'])
             return user
+        
+        try:
+            return self._cached('users', str(user_id), load)
         except:
             return None
     
@@ -44,9 +540,13 @@ class Database:
         result = self.routines.insert_one(routine_data)
         return result.inserted_id
     
+    def _routines_cursor(self, user_id):
+        """Cursor for a user's routines query"""
+        return self.routines.find({'user_id': user_id})
+    
     def get_user_routines(self, user_id):
         """Get all routines for a user"""
-        routines = list(self.routines.find({'user_id': user_id}))
+        routines = list(self._routines_cursor(user_id))
         for routine in routines:
             routine['_id'] = str(routine['_id'])
         return routines
@@ -54,60 +554,302 @@ class Database:
     def save_meeting(self, meeting_data):
         """Save a meeting or event"""
         meeting_data['created_at'] = datetime.now()
-        result = self.meetings.insert_one(meeting_data)
-        return result.inserted_id
+        return self._insert(self.meetings, meeting_data)
     
-    def get_user_meetings(self, user_id, date=None):
-        """Get meetings for a user, optionally filtered by date"""
+    def _meetings_cursor(self, user_id, date=None, projection=None):
+        """Cursor for a user's meetings query"""
         query = {'user_id': user_id}
         if date:
             query['date'] = date
-        
-        meetings = list(self.meetings.find(query).sort('date', 1))
-        for meeting in meetings:
-            meeting['_id'] = str(meeting['_id'])
-        return meetings
+        return self.meetings.find(query, projection).sort('date', 1)
+    
+    def get_user_meetings(self, user_id, date=None, fields=None, lean=None):
+        """Get meetings for a user, optionally filtered by date"""
+        cursor = self._meetings_cursor(user_id, date, _projection(fields))
+        return _read_rows(cursor, fields, lean)
     
     def save_expense(self, expense_data):
         """Save an expense record"""
         expense_data['created_at'] = datetime.now()
-        result = self.expenses.insert_one(expense_data)
-        return result.inserted_id
+        return self._insert(self.expenses, expense_data)
+    
+    def save_expenses(self, expenses):
+        """Save many expense records with batched insert_many calls; returns their ids"""
+        now = datetime.now()
+        for expense_data in expenses:
+            expense_data['created_at'] = now
+        if self.write_buffer is not None:
+            return [self.write_buffer.add(self.expenses.name, expense) for expense in expenses]
+        if not expenses:
+            return []
+        try:
+            inserted_ids = self.expenses.insert_many(expenses, ordered=False).inserted_ids
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            self._after_insert('expenses', [exp for i, exp in enumerate(expenses) if i not in failed])
+            raise
+        self._after_insert('expenses', expenses)
+        return inserted_ids
     
-    def get_user_expenses(self, user_id, start_date=None, end_date=None):
-        """Get expenses for a user within a date range"""
+    def _expenses_cursor(self, user_id, start_date=None, end_date=None, projection=None):
+        """Cursor for a user's expenses query"""
         query = {'user_id': user_id}
         if start_date and end_date:
             query['date'] = {'$gte': start_date, '$lte': end_date}
+        return self.expenses.find(query, projection).sort('date', -1)
+    
+    def get_user_expenses(self, user_id, start_date=None, end_date=None, fields=None, lean=None):
+        """
+        Get expenses for a user within a date range
         
-        expenses = list(self.expenses.find(query).sort('date', -1))
-        for expense in expenses:
-            expense['_id'] = str(expense['_id'])
-        return expenses
+        Args:
+            fields: Optional list of fields to fetch (projection)
+            lean: None for dicts, 'tuples' or 'columns' for lean rows in `fields` order
+        """
+        cursor = self._expenses_cursor(user_id, start_date, end_date, _projection(fields))
+        return _read_rows(cursor, fields, lean)
+    
+    def iter_user_expenses(self, user_id, start_date=None, end_date=None, fields=None,
+                           batch_size=EXPENSE_BATCH_SIZE):
+        """
+        Stream a user's expenses one document at a time
+        The cursor fetches `batch_size` documents per round trip, so memory stays
+        bounded however long the history is
+        """
+        cursor = self._expenses_cursor(user_id, start_date, end_date, _projection(fields))
+        for expense in cursor.batch_size(batch_size):
+            if '_id' in expense:
+                expense['_id'] = str(expense['_id'])
+            yield expense
+    
+    def get_expense_summary(self, user_id, start_date=None, end_date=None):
+        """
+        Pre-aggregate a user's expenses in MongoDB with a $group pipeline
+        
+        Returns:
+            {
+                'total': 1250.0, 'count': 42,
+                'first_date': '2024-01-03', 'last_date': '2024-03-28',
+                'categories': {'Food': {'total': 600.0, 'count': 20}, ...},
+                'monthly_totals': {'2024-01': 400.0, ...}   # chronological
+            }
+        Expenses without a category are grouped under None.
+        """
+        query = {'user_id': user_id}
+        if start_date and end_date:
+            query['date'] = {'$gte': start_date, '$lte': end_date}
+        result = next(self.expenses.aggregate(_summary_pipeline(query)), {})
+        return _summary_from_facets(result)
+    
+    def _apply_rollups(self, expenses):
+        """$inc the monthly_rollups documents for newly written expenses"""
+        try:
+            # Users whose rollups this call built, or a build in progress will count, skip the $inc
+            skipped = {
+                user_id for user_id in {expense.get('user_id') for expense in expenses}
+                if user_id is not None and self._ensure_rollups(user_id, writing=True)
+            }
+            updates = _rollup_updates(expense for expense in expenses if expense.get('user_id') not in skipped)
+            if updates:
+                self.monthly_rollups.bulk_write(updates, ordered=False)
+        except Exception:
+            # The expense itself is stored; rebuild_monthly_rollups() repairs the drift
+            logger.exception('Error updating monthly rollups')
+    
+    def _ensure_rollups(self, user_id, writing=False):
+        """
+        Build a user's monthly_rollups from their expenses the first time they are
+        read or written (expenses stored before rollups existed, or inserted
+        directly, are otherwise missing)
+        
+        The user's rollup_backfills marker guards the build. While it is
+        'building', writers flag it dirty instead of $inc-ing (the build's $merge
+        would overwrite the $inc), and the builder runs again until a pass ends
+        with no write flagged.
+        
+        Args:
+            writing: The caller is about to $inc rollups for new expenses
+        
+        Returns:
+            Whether the caller must skip its $inc: this call built the rollups,
+            or (writing=True) the build in progress will count its expenses
+        """
+        if user_id in self._rollups_ready:
+            return False
+        now = datetime.now()
+        try:
+            # Claiming the marker first means only one process backfills a user
+            self.rollup_backfills.insert_one({
+                '_id': user_id, 'state': 'building', 'dirty': False, 'started_at': now, 'created_at': now
+            })
+        except DuplicateKeyError:
+            if writing:
+                marker = self.rollup_backfills.find_one_and_update(
+                    {'_id': user_id, 'state': 'building'}, {'$set': {'dirty': True}}
+                )
+            else:
+                marker = self.rollup_backfills.find_one({'_id': user_id})
+            if marker is None or marker.get('state', 'ready') != 'building':
+                self._rollups_ready.add(user_id)
+                return False
+            if marker['started_at'] > now - timedelta(seconds=ROLLUP_BACKFILL_TIMEOUT):
+                return writing
+            # The builder stalled (e.g. its process died): take the build over
+            if self.rollup_backfills.update_one(
+                {'_id': user_id, 'state': 'building', 'started_at': marker['started_at']},
+                {'$set': {'started_at': now, 'dirty': False}}
+            ).matched_count == 0:
+                return writing
+        self._build_rollups(user_id)
+        return True
+    
+    def _build_rollups(self, user_id):
+        """Rebuild a user's rollups until no write lands during a pass (caller holds the building marker)"""
+        try:
+            while True:
+                self._rebuild_rollups({'user_id': user_id})
+                if self.rollup_backfills.update_one(
+                    {'_id': user_id, 'state': 'building', 'dirty': False}, {'$set': {'state': 'ready'}}
+                ).matched_count:
+                    break
+                # A writer flagged the marker during the pass; unless the build was finished elsewhere, go again
+                if self.rollup_backfills.update_one(
+                    {'_id': user_id, 'state': 'building', 'dirty': True}, {'$set': {'dirty': False}}
+                ).matched_count == 0:
+                    break
+        except Exception:
+            # Leave the backfill to the next read or write
+            self.rollup_backfills.delete_one({'_id': user_id})
+            raise
+        self._rollups_ready.add(user_id)
+    
+    def _apply_accumulators(self, expenses):
+        """$inc the spending_accumulators documents for newly written expenses"""
+        updates = accumulator_updates(expenses)
+        if not updates:
+            return
+        try:
+            result = self.spending_accumulators.bulk_write(list(updates.values()), ordered=False)
+            # A newly created document only holds this batch: backfill the user's older expenses once
+            user_ids = list(updates)
+            for index in result.upserted_ids:
+                self.rebuild_spending_accumulators(user_ids[index])
+        except Exception:
+            # The expense itself is stored; rebuild_spending_accumulators() repairs the drift
+            logger.exception('Error updating spending accumulators')
+    
+    def get_spending_accumulator(self, user_id):
+        """A user's SpendingAccumulator, or None if none has been written yet"""
+        document = self.spending_accumulators.find_one({'user_id': user_id}, {'_id': 0})
+        return SpendingAccumulator.from_document(document) if document else None
+    
+    def rebuild_spending_accumulators(self, user_id=None):
+        """
+        Backfill or rebuild spending_accumulators from the expenses collection
+        Rebuilds one user when user_id is given, otherwise every user; returns the count
+        """
+        if user_id is None:
+            self.spending_accumulators.delete_many({})
+        user_ids = [user_id] if user_id is not None else self.expenses.distinct('user_id')
+        for uid in user_ids:
+            accumulator = SpendingAccumulator.from_expenses(
+                self.iter_user_expenses(uid, fields=('amount', 'category', 'date'))
+            )
+            document = dict(accumulator.to_document(), user_id=uid, updated_at=datetime.now())
+            self.spending_accumulators.replace_one({'user_id': uid}, document, upsert=True)
+        return len(user_ids)
+    
+    def rebuild_monthly_rollups(self, user_id=None):
+        """
+        Backfill or rebuild monthly_rollups from the expenses collection
+        Rebuilds one user when user_id is given, otherwise every user
+        """
+        match = {'user_id': user_id} if user_id is not None else {}
+        count = self._rebuild_rollups(match)
+        user_ids = [user_id] if user_id is not None else self.expenses.distinct('user_id')
+        markers = _backfill_markers(user_ids)
+        if markers:
+            self.rollup_backfills.bulk_write(markers, ordered=False)
+        self._rollups_ready.update(user_id for user_id in user_ids if user_id is not None)
+        return count
+    
+    def _rebuild_rollups(self, match):
+        """Replace the monthly_rollups matching `match` with ones aggregated from expenses"""
+        self.monthly_rollups.delete_many(match)
+        self.expenses.aggregate(_rebuild_pipeline(match))
+        return self.monthly_rollups.count_documents(match)
+    
+    def get_monthly_rollups(self, user_id, start_month=None, end_month=None):
+        """Get a user's monthly rollups ('YYYY-MM' bounds inclusive), oldest first"""
+        self._ensure_rollups(user_id)
+        query = {'user_id': user_id}
+        if start_month or end_month:
+            query['month'] = {}
+            if start_month:
+                query['month']['$gte'] = start_month
+            if end_month:
+                query['month']['$lte'] = end_month
+        return list(self.monthly_rollups.find(query, {'_id': 0}).sort('month', 1))
+    
+    def get_rollup_summary(self, user_id, start_month=None, end_month=None):
+        """
+        Same shape as get_expense_summary, read from monthly_rollups
+        Costs O(months) instead of O(transactions)
+        """
+        return _combine_rollups(self.get_monthly_rollups(user_id, start_month, end_month))
+    
+    def get_budget_actuals(self, user_id, month):
+        """Actual spending per category for a 'YYYY-MM' budget (BUDGET_SCHEMA actual_spending)"""
+        self._ensure_rollups(user_id)
+        rollup = self.monthly_rollups.find_one({'user_id': user_id, 'month': month}, {'_id': 0})
+        return _budget_actuals(rollup)
     
     def save_task(self, task_data):
         """Save a task"""
         task_data['created_at'] = datetime.now()
-        result = self.tasks.insert_one(task_data)
-        return result.inserted_id
+        return self._insert(self.tasks, task_data)
     
-    def get_user_tasks(self, user_id, date=None):
-        """Get tasks for a user"""
+    def _tasks_cursor(self, user_id, date=None, projection=None):
+        """Cursor for a user's tasks query"""
         query = {'user_id': user_id}
         if date:
             query['date'] = date
+        return self.tasks.find(query, projection).sort('priority', -1)
+    
+    def get_user_tasks(self, user_id, date=None, fields=None, lean=None):
+        """Get tasks for a user"""
+        cursor = self._tasks_cursor(user_id, date, _projection(fields))
+        return _read_rows(cursor, fields, lean)
+    
+    def get_analysis_inputs(self, user_id, date=None, deadline=None):
+        """
+        Fetch everything /api/analysis/comprehensive needs concurrently on the
+        shared fan-out pool (see fanout)
+        
+        Args:
+            date: Only meetings on this date
+            deadline: time.monotonic() value to finish by (raises fanout.DeadlineExceeded)
         
-        tasks = list(self.tasks.find(query).sort('priority', -1))
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-        return tasks
+        Returns:
+            (user_profile, expense_summary, tasks, meetings) with tasks as
+            (priority,) tuples and meetings as (date,) tuples
+        """
+        return run_concurrently([
+            lambda: self.get_user_profile(user_id),
+            lambda: self.get_rollup_summary(user_id),
+            lambda: self.get_user_tasks(user_id, fields=('priority',), lean='tuples'),
+            lambda: self.get_user_meetings(user_id, date, fields=('date',), lean='tuples')
+        ], deadline)
     
     def get_user_finance_profile(self, user_id):
         """Get user's finance profile"""
-        profile = self.db['finance_profiles'].find_one({'user_id': user_id})
-        if profile:
-            profile['_id'] = str(profile['_id'])
-        return profile
+        def load():
+            profile = self.db['finance_profiles'].find_one({'user_id': user_id})
+            if profile:
+                profile['_id'] = str(profile['_id'])
+            return profile
+        
+        return self._cached('finance_profiles', user_id, load)
     
     def update_user_finance_profile(self, user_id, profile_data):
         """Update or create user's finance profile"""
@@ -117,6 +859,8 @@ class Database:
                 {'$set': profile_data},
                 upsert=True
             )
+            self.cache.invalidate(('finance_profiles', user_id))
+            self.bump_data_version(user_id)
             return result.acknowledged
         except Exception as e:
             print(f"Error updating finance profile: {e}")
@@ -124,10 +868,13 @@ class Database:
     
     def get_user_location(self, user_id):
         """Get user's saved location"""
-        location = self.db['user_locations'].find_one({'user_id': user_id})
-        if location:
-            location['_id'] = str(location['_id'])
-        return location
+        def load():
+            location = self.db['user_locations'].find_one({'user_id': user_id})
+            if location:
+                location['_id'] = str(location['_id'])
+            return location
+        
+        return self._cached('user_locations', user_id, load)
     
     def save_user_location(self, user_id, location_data):
         """Save or update user's location"""
@@ -137,22 +884,29 @@ class Database:
                 {'$set': location_data},
                 upsert=True
             )
+            self.cache.invalidate(('user_locations', user_id))
             return result.acknowledged
         except Exception as e:
             print(f"Error saving location: {e}")
             return False
     
-    def get_financial_goals(self, user_id):
-        """Get user's financial goals"""
-        goals = list(self.db['financial_goals'].find({'user_id': user_id}))
-        for goal in goals:
-            goal['_id'] = str(goal['_id'])
-        return goals
+    def _goals_cursor(self, user_id, projection=None):
+        """Cursor for a user's financial goals query"""
+        return self.db['financial_goals'].find({'user_id': user_id}, projection)
+    
+    def get_financial_goals(self, user_id, fields=None, lean=None):
+        """Get user's financial goals (full documents are served from the cache)"""
+        if fields is None and lean is None:
+            return self._cached('financial_goals', user_id,
+                                lambda: _read_rows(self._goals_cursor(user_id)))
+        cursor = self._goals_cursor(user_id, _projection(fields))
+        return _read_rows(cursor, fields, lean)
     
     def add_financial_goal(self, goal_data):
         """Add a financial goal"""
         goal_data['created_at'] = datetime.now()
         result = self.db['financial_goals'].insert_one(goal_data)
+        self.cache.invalidate(('financial_goals', goal_data.get('user_id')))
         return result.inserted_id
     
     def add_expense(self, expense_data):
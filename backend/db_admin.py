@@ -0,0 +1,83 @@
+"""
+Database maintenance commands
+
+Usage:
+    python db_admin.py ensure-indexes
+    python db_admin.py audit-indexes [--user-id USER_ID]
+    python db_admin.py rebuild-rollups [--user-id USER_ID]
+    python db_admin.py rebuild-accumulators [--user-id USER_ID]
+"""
+
+import argparse
+import sys
+from dotenv import load_dotenv
+from database import Database, INDEXES
+
+
+def ensure_indexes(db, args):
+    """Apply the declarative index manifest"""
+    db._create_indexes()
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            unique = ' (unique)' if options.get('unique') else ''
+            print(f"{collection_name}: {keys}{unique}")
+    return 0
+
+
+def audit_indexes(db, args):
+    """Explain every Database.get_* query and flag collection scans"""
+    report = db.audit_query_plans(args.user_id or '__plan_audit__')
+    problems = 0
+    for entry in report:
+        if not entry['index_backed']:
+            status = 'COLLSCAN'
+            problems += 1
+        elif entry['blocking_sort']:
+            status = 'IN-MEMORY SORT'
+            problems += 1
+        else:
+            status = 'OK'
+        indexes = ', '.join(entry['indexes']) or '-'
+        print(f"[{status}] {entry['query']} on {entry['collection']} "
+              f"(stages: {' > '.join(entry['stages'])}; indexes: {indexes})")
+    print(f"{len(report)} queries audited, {problems} not fully index-backed")
+    return 1 if problems else 0
+
+
+def rebuild_rollups(db, args):
+    """Backfill or rebuild monthly_rollups from raw expenses"""
+    rebuilt = db.rebuild_monthly_rollups(args.user_id)
+    scope = f"user {args.user_id}" if args.user_id else 'all users'
+    print(f"Rebuilt {rebuilt} monthly rollups for {scope}")
+    return 0
+
+
+def rebuild_accumulators(db, args):
+    """Backfill or rebuild spending_accumulators from raw expenses"""
+    rebuilt = db.rebuild_spending_accumulators(args.user_id)
+    scope = f"user {args.user_id}" if args.user_id else 'all users'
+    print(f"Rebuilt {rebuilt} spending accumulators for {scope}")
+    return 0
+
+
+COMMANDS = {
+    'ensure-indexes': ensure_indexes,
+    'audit-indexes': audit_indexes,
+    'rebuild-rollups': rebuild_rollups,
+    'rebuild-accumulators': rebuild_accumulators,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Life Pilot AI database maintenance')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--user-id', default=None,
+                        help='user_id to audit queries with or to rebuild rollups/accumulators for')
+    args = parser.parse_args(argv)
+    
+    load_dotenv()
+    return COMMANDS[args.command](Database(), args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Streaming bulk expense import
+Parses a CSV or NDJSON request body row by row, validates each row with the
+EXPENSE_SCHEMA rules from database/schemas.py and hands valid rows to an insert
+callback in batches, so an upload is never held in memory as a whole.
+"""
+
+import csv
+import importlib.util
+import io
+import json
+import math
+import os
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+
+# Rows handed to the insert callback at a time
+IMPORT_BATCH_SIZE = 1000
+
+# Per-row errors kept in the report (the count is always exact)
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'ndjson')
+
+_SCHEMAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'schemas.py')
+_schemas = None
+
+
+def get_schemas():
+    """
+    Load database/schemas.py
+    It is loaded by path because the package name `database` is shadowed by
+    backend/database.py
+    """
+    global _schemas
+    if _schemas is None:
+        spec = importlib.util.spec_from_file_location('lifepilot_schemas', _SCHEMAS_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _schemas = module
+    return _schemas
+
+
+def detect_format(content_type, requested=None):
+    """'csv' or 'ndjson' from an explicit ?format= or the Content-Type"""
+    if requested:
+        requested = requested.lower()
+        if requested in ('jsonl', 'json'):
+            requested = 'ndjson'
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        return requested
+    content_type = (content_type or '').lower()
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_csv_rows(stream):
+    """Yield (row_number, row, error) from a CSV byte stream with a header line"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row_number, row in enumerate(reader, start=1):
+        if None in row:
+            yield row_number, None, 'Too many columns'
+            continue
+        yield row_number, {key.strip(): value for key, value in row.items() if key and value not in (None, '')}, None
+
+
+def iter_ndjson_rows(stream):
+    """Yield (row_number, row, error) from an NDJSON byte stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    row_number = 0
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, 'Each line must be a JSON object'
+            continue
+        yield row_number, row, None
+
+
+def normalize_expense(row, default_user_id=None):
+    """
+    Coerce one parsed row into an expense and validate it (raises ValueError)
+    Numbers and booleans may arrive as strings (CSV) or JSON values (NDJSON)
+    """
+    expense = dict(row)
+    if not expense.get('user_id') and default_user_id:
+        expense['user_id'] = default_user_id
+    
+    get_schemas().validate_expense(expense)
+    
+    try:
+        expense['amount'] = float(expense['amount'])
+    except (TypeError, ValueError):
+        raise ValueError(f"amount must be a number, got {expense['amount']!r}")
+    if not math.isfinite(expense['amount']):
+        raise ValueError(f"amount must be a finite number, got {expense['amount']!r}")
+    if expense['amount'] < 0:
+        raise ValueError('amount must not be negative')
+    
+    try:
+        datetime.strptime(str(expense['date']), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"date must be YYYY-MM-DD, got {expense['date']!r}")
+    
+    if 'is_recurring' in expense and not isinstance(expense['is_recurring'], bool):
+        expense['is_recurring'] = str(expense['is_recurring']).strip().lower() in ('1', 'true', 'yes')
+    if isinstance(expense.get('tags'), str):
+        expense['tags'] = [tag.strip() for tag in expense['tags'].split(';') if tag.strip()]
+    return expense
+
+
+def import_expenses(rows, insert_batch, default_user_id=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate parsed rows and insert them in batches
+    
+    Args:
+        rows: Iterable of (row_number, row, error) from iter_csv_rows / iter_ndjson_rows
+        insert_batch: Callback taking a list of valid expenses; a BulkWriteError from
+            an unordered insert fails only the rows in its writeErrors
+        default_user_id: user_id for rows that do not name one
+    
+    Returns:
+        {'imported': 980, 'failed': 20, 'errors': [{'row': 7, 'message': ...}], 'errors_truncated': False}
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    
+    def fail(row_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'message': message})
+        else:
+            report['errors_truncated'] = True
+    
+    def flush(batch):
+        try:
+            insert_batch([expense for _, expense in batch])
+            report['imported'] += len(batch)
+        except BulkWriteError as e:
+            # Unordered insert: every row without a write error was written
+            write_errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+            report['imported'] += len(batch) - len(write_errors)
+            for index, (row_number, _) in enumerate(batch):
+                if index in write_errors:
+                    fail(row_number, f"Insert failed: {write_errors[index].get('errmsg', e)}")
+        except Exception as e:
+            for row_number, _ in batch:
+                fail(row_number, f"Insert failed: {e}")
+    
+    batch = []
+    for row_number, row, error in rows:
+        if error is None:
+            try:
+                batch.append((row_number, normalize_expense(row, default_user_id)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            fail(row_number, error)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
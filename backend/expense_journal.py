@@ -0,0 +1,283 @@
+"""
+Append-only journal with snapshots behind an ExpenseStore
+Every add/delete is appended to a JSON-lines log and fsync'd in batches by a
+background thread, so writes keep in-memory latency and at most
+fsync_interval seconds of them are at risk on a crash. Once the log grows
+past snapshot_every entries the store's state is written out as a
+compacted snapshot and older logs are dropped.
+
+Files for a journal named NAME in the data directory:
+    NAME.snapshot       pickled {"generation": G} header, then the pickled store state
+    NAME.<g>.log        entries since snapshot generation g, one JSON object per line
+    NAME.lock           held (flock) by the one process that owns the journal
+Recovery loads the snapshot and replays every log with g >= G in order. The
+snapshot is pickled because it is by far the larger file and holds NumPy
+columns that unpickle as raw buffers; it is only ever read back by this
+process's own code.
+
+One process owns a journal at a time: acquire() takes an exclusive lock on
+NAME.lock, and a second process (e.g. another gunicorn worker) is refused so
+that it cannot interleave log lines or delete logs the owner still needs.
+A process forked from the owner inherits neither the ownership nor the open
+log; its appends, syncs and snapshots are skipped.
+"""
+
+import atexit
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger('lifepilot.expense_journal')
+
+
+class JournalLocked(RuntimeError):
+    """Raised by open() when another process owns the journal"""
+
+
+class ExpenseJournal:
+    """Durable log of ExpenseStore mutations"""
+    
+    def __init__(self, directory, name, fsync_interval=0.05, snapshot_every=200000):
+        """
+        Args:
+            directory: Folder holding the snapshot and log files
+            name: File name prefix (one journal per store)
+            fsync_interval: Seconds between batched fsyncs
+            snapshot_every: Log entries after which a snapshot is due
+        """
+        self.directory = directory
+        self.name = name
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        
+        self.generation = self._snapshot_generation()  # generation being appended to
+        self.entries = 0
+        self._file = None
+        self._dirty = False
+        self._lock = threading.Lock()        # guards the open log and its buffer
+        self._sync_lock = threading.Lock()   # keeps rotation from closing a file mid-fsync
+        self.snapshot_lock = threading.Lock()  # held while a snapshot is being taken
+        self._closed = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self._owner_pid = None
+        
+        atexit.register(self.close)
+    
+    def _path(self, suffix):
+        """Path of one of this journal's files"""
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+    
+    def acquire(self):
+        """
+        Take exclusive ownership of the journal's files without blocking
+        Returns False if another live process owns them (the lock is released
+        when that process exits, however it exits)
+        """
+        if self._owned():
+            return True
+        lock_file = open(self._path('lock'), 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._owner_pid = os.getpid()
+        return True
+    
+    def _owned(self):
+        """Whether this process holds the journal's lock"""
+        return self._owner_pid == os.getpid()
+    
+    def _log_generations(self):
+        """Generations of the log files on disk, oldest first"""
+        pattern = re.compile(rf'^{re.escape(self.name)}\.(\d+)\.log$')
+        generations = []
+        for file_name in os.listdir(self.directory):
+            match = pattern.match(file_name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+    
+    def _snapshot_generation(self):
+        """Generation recorded in the snapshot header (0 without a snapshot)"""
+        try:
+            with open(self._path('snapshot'), 'rb') as f:
+                return pickle.load(f)['generation']
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+            return 0
+    
+    def load(self):
+        """
+        Read the snapshot and the logs written after it
+        
+        Returns:
+            (snapshot, entries): snapshot state (None without one) and log entries to replay, in order
+        """
+        snapshot = None
+        try:
+            with open(self._path('snapshot'), 'rb') as f:
+                pickle.load(f)
+                snapshot = pickle.load(f)
+        except OSError:
+            pass
+        except (EOFError, pickle.UnpicklingError) as e:
+            logger.warning('Error reading expense snapshot (%s): %s', self.name, e)
+        
+        entries = []
+        snapshot_generation = self._snapshot_generation()
+        for generation in self._log_generations():
+            if generation >= snapshot_generation:
+                entries.extend(self._read_log(self._path(f'{generation}.log')))
+                # A crash between rotate() and write_snapshot() leaves newer logs
+                self.generation = max(self.generation, generation)
+        self.entries = len(entries)
+        return snapshot, entries
+    
+    def _read_log(self, path):
+        """Parse a log file, skipping a torn final line left by a crash"""
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = [line for line in f.read().split('\n') if line]
+        if not lines:
+            return []
+        try:
+            # One C-level parse is far faster than a json.loads per line
+            return json.loads('[' + ','.join(lines) + ']')
+        except ValueError:
+            entries = []
+            for line in lines:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning('Skipping corrupt journal line in %s', path)
+            return entries
+    
+    def open(self):
+        """Start appending to the current generation's log (takes ownership first)"""
+        if not self.acquire():
+            raise JournalLocked(f"Expense journal {self.name} in {self.directory} is owned by another process")
+        with self._lock:
+            if self._file is None:
+                path = self._path(f'{self.generation}.log')
+                self._file = open(path, 'a', encoding='utf-8')
+                if self._ends_torn(path):
+                    # Keep the next entry off a torn line left by a crash
+                    self._file.write('\n')
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'journal-{self.name}', daemon=True)
+            self._thread.start()
+    
+    def _ends_torn(self, path):
+        """Whether a log file ends mid-line"""
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    
+    def append_add(self, record):
+        """Log an added record"""
+        self._append(json.dumps({'a': record}, default=str))
+    
+    def append_adds(self, records):
+        """Log several added records in one write"""
+        self._append('\n'.join(json.dumps({'a': record}, default=str) for record in records), len(records))
+    
+    def append_delete(self, expense_id, user_id):
+        """Log a delete of one user's records with this id"""
+        self._append(json.dumps({'d': expense_id, 'u': user_id}, default=str))
+    
+    def _append(self, lines, count=1):
+        """Buffer log lines (the background syncer makes them durable)"""
+        if not self._owned():
+            return
+        with self._lock:
+            self._file.write(lines + '\n')
+            self._dirty = True
+            self.entries += count
+    
+    def snapshot_due(self):
+        """Whether the log has grown enough to be worth compacting"""
+        return self._owned() and self.entries >= self.snapshot_every and not self.snapshot_lock.locked()
+    
+    def _run(self):
+        """Group-commit loop: one fsync covers every append since the last one"""
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+    
+    def sync(self):
+        """Flush and fsync everything appended so far"""
+        if not self._owned():
+            return
+        with self._sync_lock:
+            with self._lock:
+                if self._file is None or not self._dirty:
+                    return
+                self._file.flush()
+                self._dirty = False
+                fd = self._file.fileno()
+            os.fsync(fd)
+    
+    def rotate(self):
+        """
+        Start a new log generation; returns it
+        Call while the store is quiescent, then write_snapshot() of that same state
+        """
+        with self._sync_lock, self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self.generation += 1
+            self.entries = 0
+            self._dirty = False
+            self._file = open(self._path(f'{self.generation}.log'), 'a', encoding='utf-8')
+            return self.generation
+    
+    def write_snapshot(self, state, generation):
+        """Atomically replace the snapshot, then drop logs it covers"""
+        tmp_path = self._path('snapshot.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'generation': generation}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path('snapshot'))
+        
+        for old in self._log_generations():
+            if old < generation:
+                try:
+                    os.remove(self._path(f'{old}.log'))
+                except OSError as e:
+                    logger.warning('Error removing old journal log (%s): %s', self.name, e)
+    
+    def close(self):
+        """Flush, fsync, stop the background syncer and give up ownership"""
+        if not self._owned():
+            # A forked child must not flush the owner's buffered lines a second time
+            return
+        self._closed.set()
+        self.sync()
+        with self._sync_lock, self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+                self._owner_pid = None
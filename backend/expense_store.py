@@ -0,0 +1,740 @@
+"""
+In-memory expense store for the cost tracker endpoints
+Records are partitioned by user_id and bucketed by (year, month) at insert time,
+so a user's list costs O(their records) and a month view O(records in that month).
+An id -> slot index makes deletes O(1): the slot is tombstoned in place and a
+user's partition is compacted once tombstones outnumber live records.
+
+Storage is columnar: amounts live in a float64 array, dates as int32 day
+ordinals, created_at as int64 microseconds, and category / payment_method /
+frequency as int32 codes into a store-wide dictionary. Dicts are only built
+when records are read back for a response. A value a column cannot reproduce exactly (an int amount, a
+non-canonical date, an unexpected field) is kept verbatim in a per-row
+extras dict, so every record reads back exactly as it was added.
+
+Every add/delete bumps the user's version(), which listings use as an ETag,
+and page() walks a user's records in id order from a cursor: it binary-searches
+the cursor in an id-ordered view of the slots, so a page costs O(log n + limit).
+Ids from new_id are time-ordered, so slot order usually is id order; a user
+whose ids arrive out of order gets a sorted slot index, built on first use and
+kept in order by later appends.
+
+Each (user, month) also keeps a running aggregate (total, count, per-category
+sums, per-day counts) that add and delete update, so month_totals() costs
+O(categories + days) however many records the month holds.
+
+Durability: given an ExpenseJournal, every mutation is also appended to its
+log (under the same stripe) and the store is rebuilt from snapshot + log at
+startup; see expense_journal.py.
+
+Thread safety: writers take one of LOCK_STRIPES locks chosen by user_id, so
+writes for different users rarely contend. Readers take no lock. A partition is
+only ever appended to or tombstoned in place; arrays that need to grow are
+copied and swapped in before the new row is published, and compaction builds a
+fresh partition and swaps it in with one assignment, so a reader always sees a
+consistent snapshot.
+"""
+
+import gc
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import numpy as np
+
+logger = logging.getLogger('lifepilot.expense_store')
+
+# Never compact a partition over fewer tombstones than this
+COMPACT_MIN_TOMBSTONES = 64
+
+# Number of per-user writer locks
+LOCK_STRIPES = 64
+
+# Bits of a row's `present` mask: which fields decode from the columns
+ID = 1
+USER = 2
+AMOUNT = 4
+DATE = 8
+CREATED = 16
+CATEGORY = 32
+PAYMENT = 64
+FREQUENCY = 128
+DESCRIPTION = 256
+
+# Bit of each field a row can decode from the columns (the id field is added per store)
+FIELD_BITS = {
+    'user_id': USER, 'amount': AMOUNT, 'date': DATE, 'created_at': CREATED, 'description': DESCRIPTION,
+    'category': CATEGORY, 'payment_method': PAYMENT, 'frequency': FREQUENCY,
+}
+ALL_BITS = 0x1FF
+
+# Dictionary-encoded fields and their bits
+CODED_FIELDS = (('category', CATEGORY), ('payment_method', PAYMENT), ('frequency', FREQUENCY))
+
+COLUMN_TYPES = {
+    'amount': np.float64,
+    'day': np.int32,        # date.toordinal(), 0 when the date is missing or invalid
+    'created': np.int64,    # microseconds since 1970-01-01 (naive local time)
+    'category': np.int32,   # dictionary codes, -1 when the value is not in the column
+    'payment_method': np.int32,
+    'frequency': np.int32,
+    'present': np.uint16,
+    'alive': np.bool_,
+}
+
+INITIAL_CAPACITY = 16
+
+# Running totals of one user's month; replaced, never mutated, so readers need no lock
+# categories: category code -> (summed amount, record count), days: day ordinal -> record count
+MonthAggregate = namedtuple('MonthAggregate', ['total', 'count', 'categories', 'days'])
+EMPTY_AGGREGATE = MonthAggregate(0.0, 0, {}, {})
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@lru_cache(maxsize=8192)
+def _parse_day(value):
+    """(ordinal, canonical) for a date string; ordinal 0 if it does not parse"""
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return 0, False
+    return parsed.toordinal(), parsed.strftime('%Y-%m-%d') == value
+
+
+@lru_cache(maxsize=8192)
+def _day_string(ordinal):
+    """'YYYY-MM-DD' for a day ordinal"""
+    return date.fromordinal(ordinal).isoformat()
+
+
+def _month_of(ordinal):
+    """(year, month) bucket for a day ordinal"""
+    day = date.fromordinal(ordinal)
+    return day.year, day.month
+
+
+def _parse_created(value):
+    """Microseconds for a naive isoformat() string, None if it would not round-trip"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def _created_string(micros):
+    """isoformat() string for microseconds since the epoch"""
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def _position_after(order, keys, key, stop):
+    """Number of leading slots in order[:stop] (id-ordered) whose key is <= key"""
+    low, high = 0, stop
+    while low < high:
+        middle = (low + high) // 2
+        if key < keys[order[middle]]:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class _Dictionary:
+    """Append-only value <-> code mapping shared by a store's coded columns"""
+    
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self._lock = threading.Lock()
+    
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(value)
+                if code is None:
+                    # Publish the value before its code so readers can always decode
+                    self.values.append(value)
+                    code = self.codes[value] = len(self.values) - 1
+        return code
+
+
+class _UserPartition:
+    """One user's records as columns, in insertion order"""
+    
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype) for name, dtype in COLUMN_TYPES.items()}
+        self.ids = []
+        self.keys = []  # str(id) per slot, the order page() walks
+        self.descriptions = []
+        self.extras = {}  # slot -> {field: value} the columns cannot hold
+        self.months = {}  # (year, month) -> [slots]
+        self.aggregates = {}  # (year, month) -> MonthAggregate over live slots
+        self.ids_sorted = True  # whether slot order is also id order (new_id ids are time-ordered)
+        self.sorted_slots = {}  # None or (year, month) -> slots in id order, once ids_sorted is False
+        self.dead = 0
+    
+    def append(self, row, aggregate=True):
+        """
+        Append an encoded row (caller holds the stripe); returns its slot
+        With aggregate=False the month aggregates are left for rebuild_aggregates()
+        """
+        present, record_id, description, extras, amount, day, created, codes = row
+        slot = self.size
+        arrays = self.arrays
+        if slot == len(arrays['amount']):
+            arrays = {name: np.resize(array, 2 * slot) for name, array in arrays.items()}
+            self.arrays = arrays
+        
+        arrays['amount'][slot] = amount
+        arrays['day'][slot] = day
+        arrays['created'][slot] = created
+        arrays['category'][slot], arrays['payment_method'][slot], arrays['frequency'][slot] = codes
+        arrays['present'][slot] = present
+        arrays['alive'][slot] = True
+        key = str(record_id)
+        if self.ids_sorted and slot and key < self.keys[-1]:
+            self.ids_sorted = False
+        self.ids.append(record_id)
+        self.keys.append(key)
+        self.descriptions.append(description)
+        if extras:
+            self.extras[slot] = extras
+        self.size = slot + 1
+        
+        month = None
+        if day:
+            month = _month_of(day)
+            self.months.setdefault(month, []).append(slot)
+            if aggregate:
+                self.update_aggregate(month, amount, codes[0], day, 1)
+        if self.sorted_slots:
+            for scope in (None, month) if month else (None,):
+                slots = self.sorted_slots.get(scope)
+                if slots is not None:
+                    # Copy, insert and swap in, so a reader's index never changes under it
+                    at = _position_after(slots, self.keys, key, len(slots))
+                    self.sorted_slots[scope] = slots[:at] + [slot] + slots[at:]
+        return slot
+    
+    def id_order(self, scope):
+        """
+        Slots of the whole partition (scope None) or of one (year, month), in id order
+        Includes tombstoned slots. Built on first use when ids arrived out of
+        order (caller holds the stripe)
+        """
+        slots = self.sorted_slots.get(scope)
+        if slots is None:
+            slots = list(range(self.size)) if scope is None else list(self.months.get(scope, ()))
+            slots.sort(key=self.keys.__getitem__)
+            self.sorted_slots[scope] = slots
+        return slots
+    
+    def update_aggregate(self, month, amount, category, day, sign):
+        """Add (sign=1) or remove (sign=-1) one live row from its month's aggregate"""
+        current = self.aggregates.get(month, EMPTY_AGGREGATE)
+        count = current.count + sign
+        if count <= 0:
+            self.aggregates.pop(month, None)
+            return
+        
+        categories = dict(current.categories)
+        category_total, category_count = categories.get(category, (0.0, 0))
+        if category_count + sign:
+            categories[category] = (category_total + sign * amount, category_count + sign)
+        else:
+            del categories[category]
+        days = dict(current.days)
+        days[day] = days.get(day, 0) + sign
+        if not days[day]:
+            del days[day]
+        self.aggregates[month] = MonthAggregate(current.total + sign * amount, count, categories, days)
+    
+    def rebuild_aggregates(self):
+        """Recompute every month aggregate from the columns with NumPy reductions"""
+        arrays = self.arrays
+        aggregates = {}
+        for month, slots in self.months.items():
+            slots = self.live_slots(slots)
+            if not len(slots):
+                continue
+            amounts = arrays['amount'][slots]
+            # Shift codes by one so rows without a coded category (-1) land in bin 0
+            codes = arrays['category'][slots] + 1
+            by_code = np.bincount(codes, weights=amounts)
+            seen = np.bincount(codes)
+            day_values, day_counts = np.unique(arrays['day'][slots], return_counts=True)
+            aggregates[month] = MonthAggregate(
+                float(amounts.sum()),
+                int(len(slots)),
+                {code - 1: (float(by_code[code]), int(seen[code])) for code in np.flatnonzero(seen).tolist()},
+                dict(zip(day_values.tolist(), day_counts.tolist()))
+            )
+        self.aggregates = aggregates
+    
+    def live_slots(self, slots=None):
+        """Live slots among `slots` (all slots by default) as an int64 array"""
+        if slots is None:
+            size = self.size
+            return np.flatnonzero(self.arrays['alive'][:size])
+        slots = np.asarray(slots, dtype=np.int64)
+        return slots[self.arrays['alive'][slots]]
+    
+    def export(self):
+        """Copy of the partition's state for a snapshot (caller holds the stripe)"""
+        size = self.size
+        return {
+            'arrays': {name: array[:size].copy() for name, array in self.arrays.items()},
+            'ids': self.ids[:size],
+            'descriptions': self.descriptions[:size],
+            'extras': dict(self.extras),
+            'months': {month: list(slots) for month, slots in self.months.items()},
+            'dead': self.dead
+        }
+    
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a partition from export()"""
+        partition = cls(capacity=0)
+        partition.arrays = state['arrays']
+        partition.size = len(state['ids'])
+        partition.ids = state['ids']
+        partition.descriptions = state['descriptions']
+        partition.extras = state['extras']
+        partition.months = state['months']
+        partition.dead = state['dead']
+        keys = partition.keys = [str(record_id) for record_id in partition.ids]
+        partition.ids_sorted = all(a <= b for a, b in zip(keys, keys[1:]))
+        if partition.size == 0:
+            partition.arrays = {name: np.zeros(INITIAL_CAPACITY, dtype) for name, dtype in COLUMN_TYPES.items()}
+        partition.rebuild_aggregates()
+        return partition
+
+
+class ExpenseStore:
+    """Expense records indexed by user_id -> (year, month) -> records, and by id"""
+    
+    def __init__(self, id_field='id', journal=None):
+        """
+        Args:
+            id_field: Key holding each record's id ('_id' or 'id')
+            journal: Optional ExpenseJournal to replay from and log to
+        """
+        self.id_field = id_field
+        self._users = {}
+        self._index = {}  # id -> [(user_id, slot)]; ids are not guaranteed unique
+        self._index_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._dictionary = _Dictionary()
+        self._aggregate_on_write = True
+        self._versions = {}  # user_id -> writes since startup
+        self._epoch = os.urandom(4).hex()  # keeps versions from different runs apart
+        self.journal = None
+        
+        if journal is not None:
+            gc_was_enabled = gc.isenabled()
+            gc.disable()  # millions of new objects would otherwise trigger repeated full collections
+            try:
+                self._replay(*journal.load())
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            journal.open()
+            self.journal = journal
+    
+    def _replay(self, snapshot, entries):
+        """
+        Rebuild the store from a snapshot and the log entries after it
+        Runs before the store is shared, so it skips the stripe locks, and
+        month aggregates are rebuilt once at the end instead of per entry
+        """
+        self._aggregate_on_write = False
+        if snapshot is not None:
+            self._restore(snapshot)
+        for entry in entries:
+            if 'a' in entry:
+                self._store(entry['a'])
+            else:
+                self._delete_for_user(entry['d'], entry['u'])
+        self._aggregate_on_write = True
+        for partition in self._users.values():
+            partition.rebuild_aggregates()
+    
+    def _stripe(self, user_id):
+        """Writer lock for a user's partition (lock order: stripe, then index)"""
+        return self._stripes[hash(user_id) % LOCK_STRIPES]
+    
+    def _encode(self, record):
+        """Split a record into column values and the extras the columns cannot hold"""
+        present = 0
+        record_id = description = None
+        amount = 0.0
+        day = created = 0
+        codes = [-1, -1, -1]
+        extras = {}
+        
+        for key, value in record.items():
+            if key == self.id_field:
+                present |= ID
+                record_id = value
+            elif key == 'user_id':
+                present |= USER
+            elif key == 'amount':
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    amount = float(value)
+                    if type(value) is float:
+                        present |= AMOUNT
+                        continue
+                extras[key] = value
+            elif key == 'date':
+                if isinstance(value, str):
+                    day, canonical = _parse_day(value)
+                    if canonical:
+                        present |= DATE
+                        continue
+                extras[key] = value
+            elif key == 'created_at':
+                micros = _parse_created(value) if isinstance(value, str) else None
+                if micros is None:
+                    extras[key] = value
+                else:
+                    present |= CREATED
+                    created = micros
+            elif key == 'description' and isinstance(value, str):
+                present |= DESCRIPTION
+                description = value
+            else:
+                for position, (field, bit) in enumerate(CODED_FIELDS):
+                    if key == field and (value is None or isinstance(value, str)):
+                        present |= bit
+                        codes[position] = self._dictionary.encode(value)
+                        break
+                else:
+                    extras[key] = value
+        return present, record_id, description, extras, amount, day, created, codes
+    
+    def _store(self, record):
+        """Append a record to its user's partition and index it"""
+        user_id = record.get('user_id')
+        partition = self._users.get(user_id)
+        if partition is None:
+            partition = self._users[user_id] = _UserPartition()
+        slot = partition.append(self._encode(record), self._aggregate_on_write)
+        with self._index_lock:
+            self._index.setdefault(record.get(self.id_field), []).append((user_id, slot))
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+    
+    def add(self, record):
+        """Store a record (must carry user_id); returns it"""
+        with self._stripe(record.get('user_id')):
+            self._store(record)
+            if self.journal is not None:
+                self.journal.append_add(record)
+        
+        self._maybe_snapshot()
+        return record
+    
+    def add_many(self, records):
+        """Store many records, taking each user's stripe once; returns them"""
+        by_user = {}
+        for record in records:
+            by_user.setdefault(record.get('user_id'), []).append(record)
+        
+        for user_id, user_records in by_user.items():
+            with self._stripe(user_id):
+                for record in user_records:
+                    self._store(record)
+                if self.journal is not None:
+                    self.journal.append_adds(user_records)
+        
+        self._maybe_snapshot()
+        return records
+    
+    def _field_mask(self, fields):
+        """(present-bit mask, extras keys or None for all) selecting `fields`; the id is always kept"""
+        if fields is None:
+            return ALL_BITS, None
+        mask = ID
+        for field in fields:
+            mask |= FIELD_BITS.get(field, 0)
+        return mask, set(fields) | {self.id_field}
+    
+    def _materialize(self, user_id, partition, slots, fields=None):
+        """Build response dicts for live slots (the only place rows become dicts)"""
+        mask, extra_keys = self._field_mask(fields)
+        arrays = partition.arrays
+        present = arrays['present'][slots].tolist()
+        amounts = arrays['amount'][slots].tolist()
+        days = arrays['day'][slots].tolist()
+        created = arrays['created'][slots].tolist()
+        categories = arrays['category'][slots].tolist()
+        payments = arrays['payment_method'][slots].tolist()
+        frequencies = arrays['frequency'][slots].tolist()
+        values = self._dictionary.values
+        ids, descriptions, extras = partition.ids, partition.descriptions, partition.extras
+        id_field = self.id_field
+        
+        rows = []
+        for i, slot in enumerate(slots.tolist()):
+            bits = present[i] & mask
+            row = {}
+            if bits & ID:
+                row[id_field] = ids[slot]
+            if bits & USER:
+                row['user_id'] = user_id
+            if bits & AMOUNT:
+                row['amount'] = amounts[i]
+            if bits & DATE:
+                row['date'] = _day_string(days[i])
+            if bits & CREATED:
+                row['created_at'] = _created_string(created[i])
+            if bits & DESCRIPTION:
+                row['description'] = descriptions[slot]
+            if bits & CATEGORY:
+                row['category'] = values[categories[i]]
+            if bits & PAYMENT:
+                row['payment_method'] = values[payments[i]]
+            if bits & FREQUENCY:
+                row['frequency'] = values[frequencies[i]]
+            extra = extras.get(slot)
+            if extra:
+                if extra_keys is None:
+                    row.update(extra)
+                else:
+                    row.update((key, value) for key, value in extra.items() if key in extra_keys)
+            rows.append(row)
+        return rows
+    
+    def user_expenses(self, user_id, fields=None):
+        """All of a user's records, oldest first (only `fields` plus the id, if given)"""
+        partition = self._users.get(user_id)
+        if partition is None:
+            return []
+        return self._materialize(user_id, partition, partition.live_slots(), fields)
+    
+    def month_expenses(self, user_id, year, month, fields=None):
+        """A user's records dated in the given month, oldest first"""
+        partition = self._users.get(user_id)
+        if partition is None:
+            return []
+        slots = partition.months.get((year, month))
+        if not slots:
+            return []
+        return self._materialize(user_id, partition, partition.live_slots(list(slots)), fields)
+    
+    def version(self, user_id):
+        """
+        Opaque tag that changes whenever the user's records change
+        Read it before the records so a tag never describes older data than it is sent with
+        """
+        return f"{self._epoch}-{self._versions.get(user_id, 0)}"
+    
+    def page(self, user_id, after=None, limit=50, fields=None, year=None, month=None):
+        """
+        One page of a user's records (optionally one month) in id order
+        
+        Args:
+            after: Cursor from the previous page (the last id it returned)
+            limit: Maximum records to return
+        
+        Returns:
+            (records, next_cursor): next_cursor is None on the last page
+        """
+        partition = self._users.get(user_id)
+        if partition is None:
+            return [], None
+        scope = (year, month) if year is not None and month is not None else None
+        
+        # Read the size before ids_sorted: append clears the flag before publishing a row
+        size = partition.size
+        if not partition.ids_sorted:
+            order = partition.sorted_slots.get(scope)
+            if order is None:
+                with self._stripe(user_id):
+                    order = partition.id_order(scope)
+        elif scope is None:
+            order = range(size)
+        else:
+            order = partition.months.get(scope, ())
+        stop = len(order)
+        keys = partition.keys
+        
+        # Walk forward from the cursor, skipping tombstones, until a page and one more row are found
+        alive = partition.arrays['alive']
+        position = _position_after(order, keys, str(after), stop) if after is not None else 0
+        chunk = limit + 1
+        picked = []
+        while len(picked) <= limit and position < stop:
+            window = np.asarray(order[position:min(position + chunk, stop)], dtype=np.int64)
+            picked.extend(window[alive[window]].tolist())
+            position += chunk
+            chunk *= 2
+        
+        next_cursor = keys[picked[limit - 1]] if len(picked) > limit else None
+        page_slots = np.asarray(picked[:limit], dtype=np.int64)
+        return self._materialize(user_id, partition, page_slots, fields), next_cursor
+    
+    def month_totals(self, user_id, year, month):
+        """
+        A user's month from its running aggregate, O(categories + days)
+        
+        Returns:
+            {'total': 1250.0, 'count': 42, 'days': 20, 'categories': {'Food': 600.0, ...}}
+            (records without a string category are summed under None)
+        """
+        partition = self._users.get(user_id)
+        aggregate = partition.aggregates.get((year, month), EMPTY_AGGREGATE) if partition else EMPTY_AGGREGATE
+        values = self._dictionary.values
+        categories = {}
+        for code, (amount, _) in aggregate.categories.items():
+            # An explicit None category and a missing one both report as None
+            category = values[code] if code >= 0 else None
+            categories[category] = categories.get(category, 0.0) + amount
+        return {
+            'total': aggregate.total,
+            'count': aggregate.count,
+            'days': len(aggregate.days),
+            'categories': categories
+        }
+    
+    def delete(self, expense_id):
+        """Remove every record with this id; returns whether any was found"""
+        with self._index_lock:
+            owners = {user_id for user_id, _ in self._index.get(expense_id, ())}
+        
+        found = False
+        for user_id in owners:
+            found = self._delete_for_user(expense_id, user_id) or found
+        self._maybe_snapshot()
+        return found
+    
+    def _delete_for_user(self, expense_id, user_id):
+        """Remove one user's records with this id"""
+        with self._stripe(user_id):
+            # Slots are only renumbered under this stripe, so read them here
+            with self._index_lock:
+                locations = self._index.get(expense_id, [])
+                slots = [slot for owner, slot in locations if owner == user_id]
+                remaining = [loc for loc in locations if loc[0] != user_id]
+                if remaining:
+                    self._index[expense_id] = remaining
+                else:
+                    self._index.pop(expense_id, None)
+            if not slots:
+                return False
+            
+            partition = self._users[user_id]
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            arrays = partition.arrays
+            arrays['alive'][slots] = False
+            partition.dead += len(slots)
+            if self._aggregate_on_write:
+                for slot in slots:
+                    day = int(arrays['day'][slot])
+                    if day:
+                        partition.update_aggregate(
+                            _month_of(day), float(arrays['amount'][slot]), int(arrays['category'][slot]), day, -1
+                        )
+            if partition.dead >= COMPACT_MIN_TOMBSTONES and partition.dead * 2 > partition.size:
+                self._compact(user_id, partition)
+            
+            if self.journal is not None:
+                self.journal.append_delete(expense_id, user_id)
+        return True
+    
+    def _compact(self, user_id, partition):
+        """Swap in a copy of a partition without tombstones (caller holds its stripe)"""
+        size = partition.size
+        alive = partition.arrays['alive'][:size]
+        live = np.flatnonzero(alive)
+        new_slot = np.cumsum(alive) - 1
+        
+        compacted = _UserPartition(capacity=0)
+        compacted.arrays = {name: array[:size][alive] for name, array in partition.arrays.items()}
+        if not len(live):
+            compacted.arrays = {name: np.zeros(INITIAL_CAPACITY, dtype) for name, dtype in COLUMN_TYPES.items()}
+        live_list = live.tolist()
+        compacted.ids = [partition.ids[slot] for slot in live_list]
+        compacted.keys = [partition.keys[slot] for slot in live_list]
+        compacted.descriptions = [partition.descriptions[slot] for slot in live_list]
+        compacted.extras = {
+            int(new_slot[slot]): extra for slot, extra in partition.extras.items() if alive[slot]
+        }
+        for month, slots in partition.months.items():
+            slots = np.asarray(slots, dtype=np.int64)
+            kept = new_slot[slots[alive[slots]]].tolist()
+            if kept:
+                compacted.months[month] = kept
+        compacted.size = len(live_list)
+        compacted.ids_sorted = partition.ids_sorted
+        compacted.aggregates = partition.aggregates  # totals over live rows are unchanged
+        
+        with self._index_lock:
+            # Every indexed slot is live (delete unindexes before tombstoning), so all remap
+            for expense_id in set(compacted.ids):
+                self._index[expense_id] = [
+                    (owner, int(new_slot[slot]) if owner == user_id else slot)
+                    for owner, slot in self._index[expense_id]
+                ]
+            self._users[user_id] = compacted
+    
+    def _export(self):
+        """Point-in-time copy of the whole store (caller holds every stripe)"""
+        return {
+            'id_field': self.id_field,
+            'values': list(self._dictionary.values),
+            'partitions': {user_id: partition.export() for user_id, partition in self._users.items()}
+        }
+    
+    def _restore(self, state):
+        """Load an _export() snapshot and rebuild the id index from it"""
+        self._dictionary = _Dictionary(state['values'])
+        for user_id, partition_state in state['partitions'].items():
+            partition = self._users[user_id] = _UserPartition.restore(partition_state)
+            ids = partition.ids
+            for slot in partition.live_slots().tolist():
+                self._index.setdefault(ids[slot], []).append((user_id, slot))
+    
+    def _maybe_snapshot(self):
+        """Compact the journal into a snapshot once its log is long enough"""
+        journal = self.journal
+        if journal is None or not journal.snapshot_due():
+            return
+        if not journal.snapshot_lock.acquire(blocking=False):
+            return
+        
+        try:
+            # Holding every stripe freezes writers just long enough to rotate the
+            # log and copy the columns; pickling happens in the background
+            for stripe in self._stripes:
+                stripe.acquire()
+            try:
+                generation = journal.rotate()
+                state = self._export()
+            finally:
+                for stripe in reversed(self._stripes):
+                    stripe.release()
+        except Exception:
+            journal.snapshot_lock.release()
+            logger.exception('Error starting expense snapshot (%s)', journal.name)
+            return
+        
+        def write():
+            try:
+                journal.write_snapshot(state, generation)
+            except Exception:
+                logger.exception('Error writing expense snapshot (%s)', journal.name)
+            finally:
+                journal.snapshot_lock.release()
+        
+        threading.Thread(target=write, name=f'snapshot-{journal.name}', daemon=True).start()
+    
+    def __len__(self):
+        return sum(partition.size - partition.dead for partition in list(self._users.values()))
@@ -0,0 +1,36 @@
+"""
+Encoding for user-supplied values used as MongoDB field names
+Rollups and spending accumulators key their per-category totals by category
+name and update them with $inc paths like 'categories.<name>'. A '.' in a name
+would split the path into nested fields and a '$' would be read as an operator,
+so names are percent-encoded ('%' -> '%25', '.' -> '%2E', '$' -> '%24') when
+written and decoded when read back. Names without those characters are stored
+unchanged.
+"""
+
+import re
+
+_DECODE = re.compile(r'%(25|2E|24)')
+_DECODED = {'25': '%', '2E': '.', '24': '$'}
+
+
+def encode_key(value):
+    """Field name for a value (non-strings are stringified, as a $inc path would)"""
+    return str(value).replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+
+def decode_key(key):
+    """Value of a field name written by encode_key"""
+    return _DECODE.sub(lambda match: _DECODED[match.group(1)], key) if '%' in key else key
+
+
+def decode_keys(mapping):
+    """Copy of a {encoded key: value} mapping keyed by decoded values"""
+    return {decode_key(key): value for key, value in mapping.items()}
+
+
+def encode_key_expr(expression):
+    """Aggregation expression applying encode_key to a string expression (MongoDB 4.4+)"""
+    for find, replacement in (('%', '%25'), ('.', '%2E'), ({'$literal': '$'}, '%24')):
+        expression = {'$replaceAll': {'input': expression, 'find': find, 'replacement': replacement}}
+    return expression
@@ -1,16 +1,40 @@
-from pymongo import MongoClient
 from gridfs import GridFS
 from datetime import datetime
 from bson import ObjectId
+from mongo_client import get_client, get_mongo_uri, get_database_name
 import os
 import mimetypes
 
+# File category -> extensions, shared with AsyncFileManager
+FILE_CATEGORIES = {
+    'pdf': ['.pdf'],
+    'excel': ['.xlsx', '.xls', '.xlsm', '.xlsb'],
+    'word': ['.doc', '.docx', '.odt'],
+    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp', '.ico'],
+    'csv': ['.csv', '.tsv'],
+    'text': ['.txt', '.md', '.rtf'],
+    'powerpoint': ['.ppt', '.pptx', '.odp'],
+    'archive': ['.zip', '.rar', '.7z', '.tar', '.gz'],
+    'video': ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv'],
+    'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg']
+}
+
+
+def get_file_category(extension):
+    """Categorize file by extension"""
+    for category, extensions in FILE_CATEGORIES.items():
+        if extension in extensions:
+            return category
+    
+    return 'other'
+
+
 class FileManager:
     def __init__(self):
         """Initialize File Manager with GridFS"""
-        self.mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-        self.db_name = os.getenv('DATABASE_NAME', 'lifepilot_ai')
-        self.client = MongoClient(self.mongo_uri)
+        self.mongo_uri = get_mongo_uri()
+        self.db_name = get_database_name()
+        self.client = get_client(self.mongo_uri)
         self.db = self.client[self.db_name]
         
         # GridFS for file storage
@@ -83,24 +107,7 @@ class FileManager:
     
     def _get_file_category(self, extension):
         """Categorize file by extension"""
-        categories = {
-            'pdf': ['.pdf'],
-            'excel': ['.xlsx', '.xls', '.xlsm', '.xlsb'],
-            'word': ['.doc', '.docx', '.odt'],
-            'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp', '.ico'],
-            'csv': ['.csv', '.tsv'],
-            'text': ['.txt', '.md', '.rtf'],
-            'powerpoint': ['.ppt', '.pptx', '.odp'],
-            'archive': ['.zip', '.rar', '.7z', '.tar', '.gz'],
-            'video': ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv'],
-            'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg']
-        }
-        
-        for category, extensions in categories.items():
-            if extension in extensions:
-                return category
-        
-        return 'other'
+        return get_file_category(extension)
     
     def get_file(self, file_id):
         """Retrieve file from GridFS"""
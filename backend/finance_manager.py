@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import json
 
+from forecasting import forecast_series
+
 
 class BudgetAI:
     """AI-powered budget recommendation system"""
@@ -98,6 +100,24 @@ class BudgetAI:
             amount = expense.get('amount', 0)
             category_totals[category] = category_totals.get(category, 0) + amount
         
+        return self._spending_insights(category_totals)
+    
+    def analyze_spending_summary(self, summary: Dict) -> Dict:
+        """Analyze spending patterns from Database.get_expense_summary totals"""
+        
+        if not summary.get('count'):
+            return {'message': 'No expenses to analyze'}
+        
+        category_totals = {}
+        for category, totals in summary.get('categories', {}).items():
+            category = 'Other' if category is None else category
+            category_totals[category] = category_totals.get(category, 0) + totals['total']
+        
+        return self._spending_insights(category_totals)
+    
+    def _spending_insights(self, category_totals: Dict) -> Dict:
+        """Build spending insights from per-category totals"""
+        
         total_expenses = sum(category_totals.values())
         
         # Find top spending categories
@@ -132,7 +152,12 @@ class BudgetAI:
 class ExpensePredictor:
     """Predict future expenses based on historical data"""
     
-    def __init__(self):
+    def __init__(self, forecast_cache=None):
+        """
+        Args:
+            forecast_cache: Per-user cache of fitted forecast parameters (see forecasting)
+        """
+        self.forecast_cache = forecast_cache
         self.seasonal_factors = {
             1: 1.1,   # January - New Year
             2: 0.9,   # February
@@ -148,12 +173,15 @@ class ExpensePredictor:
             12: 1.15  # December - Winter/Holidays
         }
     
-    def predict_next_month(self, historical_data: List[Dict]) -> Dict:
+    def predict_next_month(self, historical_data: List[Dict], user_id: Optional[str] = None) -> Dict:
         """
         Predict next month's expenses based on historical patterns
+        The fitted model learns the user's own seasonality from 24+ months; for
+        shorter histories the festival calendar above is applied to its forecast
         
         Args:
-            historical_data: List of monthly expense records
+            historical_data: List of monthly expense records, oldest first
+            user_id: Keys the forecast parameter cache
         
         Returns:
             Prediction with confidence level and recommendations
@@ -166,22 +194,37 @@ class ExpensePredictor:
             }
         
         # Calculate average expenses
-        total_expenses = [d['total_expenses'] for d in historical_data]
+        total_expenses = np.array([d['total_expenses'] for d in historical_data], dtype=float)
         avg_expenses = np.mean(total_expenses)
         std_expenses = np.std(total_expenses)
         
+        forecast = forecast_series(
+            total_expenses,
+            key=('expense_predictor', user_id) if user_id else None,
+            cache=self.forecast_cache
+        )
+        
         # Get current month
         current_month = datetime.now().month
         next_month = (current_month % 12) + 1
         
-        # Apply seasonal factor
-        seasonal_adjustment = self.seasonal_factors.get(next_month, 1.0)
-        predicted_expense = avg_expenses * seasonal_adjustment
+        # Apply seasonal factor unless the model already fitted the user's seasons
+        if forecast['model'] == 'holt_winters':
+            seasonal_adjustment = forecast['forecast'] / avg_expenses if avg_expenses > 0 else 1.0
+            scale = 1.0
+        else:
+            seasonal_adjustment = self.seasonal_factors.get(next_month, 1.0)
+            scale = seasonal_adjustment
+        predicted_expense = forecast['forecast'] * scale
         
-        # Calculate confidence interval
+        # Calculate confidence interval (80% prediction interval, or +/- one std with too few months)
+        if forecast['intervals']:
+            low, high = (bound * scale for bound in forecast['intervals']['80'])
+        else:
+            low, high = max(predicted_expense - std_expenses, 0.0), predicted_expense + std_expenses
         confidence_range = {
-            'low': predicted_expense - std_expenses,
-            'high': predicted_expense + std_expenses,
+            'low': low,
+            'high': high,
             'predicted': predicted_expense
         }
         
@@ -198,6 +241,8 @@ class ExpensePredictor:
             'predicted_expense': predicted_expense,
             'confidence_range': confidence_range,
             'seasonal_factor': seasonal_adjustment,
+            'model': forecast['model'],
+            'diagnostics': forecast['diagnostics'],
             'recommendations': recommendations
         }
     
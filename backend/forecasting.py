@@ -0,0 +1,379 @@
+"""
+Monthly expense forecasting
+Fits three models to each user's monthly totals and keeps whichever forecast
+the user's own history best one month ahead:
+    
+    linear          least-squares line through the months
+    holt            exponential smoothing of level and trend (4+ months)
+    holt_winters    Holt plus additive 12-month seasonality (24+ months)
+
+Many users are fitted at once: series are left-aligned in a zero-padded
+(users x months) array and every smoothing parameter on the grid is run in the
+same pass, so the Python loop is over months, not users or parameters. Models
+are compared on their one-step-ahead errors over the same months (expanding-
+window refits for the line), and those errors give the prediction intervals.
+
+Fitted parameters can be kept per user in a cache (any object with get/set,
+such as cache.TTLCache): a user's next forecast then only runs the cached
+model, and the grid search is repeated once the history has grown by
+REFIT_AFTER_MONTHS months.
+"""
+
+import numpy as np
+
+from cache import MISSING
+
+SEASON_LENGTH = 12
+MODELS = ('linear', 'holt', 'holt_winters')
+MIN_MONTHS = {'linear': 2, 'holt': 4, 'holt_winters': 2 * SEASON_LENGTH}
+
+# Smoothing parameter grid searched by least one-step squared error
+ALPHA_GRID = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+BETA_GRID = (0.01, 0.05, 0.1, 0.2, 0.3)
+GAMMA_GRID = (0.05, 0.1, 0.2, 0.3)
+
+# Series per vectorized block (bounds the holt_winters seasonal state at
+# users x grid x 12 floats)
+CHUNK_USERS = 2048
+
+# Grow this many months past the fit before searching the grid again
+REFIT_AFTER_MONTHS = 3
+
+# Two-sided normal quantiles for the prediction intervals
+INTERVAL_Z = {'80': 1.2816, '95': 1.96}
+
+
+def month_index(key):
+    """Months since year 0 for a pandas Period, date or 'YYYY-MM' key"""
+    if isinstance(key, str):
+        return int(key[:4]) * 12 + int(key[5:7]) - 1
+    return key.year * 12 + key.month - 1
+
+
+def dense_months(month_numbers, totals):
+    """
+    Monthly totals as a gap-free array from the first month to the last
+    Months without any expenses count as zero spending
+    """
+    month_numbers = np.asarray(month_numbers, dtype=np.int64)
+    totals = np.asarray(totals, dtype=float)
+    if not len(totals):
+        return totals
+    order = np.argsort(month_numbers, kind='stable')
+    month_numbers, totals = month_numbers[order], totals[order]
+    series = np.zeros(month_numbers[-1] - month_numbers[0] + 1)
+    np.add.at(series, month_numbers - month_numbers[0], totals)
+    return series
+
+
+def _grid(holt_winters=False):
+    """(alpha, beta, gamma) rows of the parameter grid, each shaped (1, G)"""
+    rows = []
+    for alpha in ALPHA_GRID:
+        for beta in BETA_GRID:
+            if not holt_winters:
+                rows.append((alpha, beta, 0.0))
+                continue
+            for gamma in GAMMA_GRID:
+                if gamma <= 1 - alpha:  # keeps the seasonal recursion stable
+                    rows.append((alpha, beta, gamma))
+    grid = np.array(rows).T
+    return grid[0][None, :], grid[1][None, :], grid[2][None, :]
+
+
+def _pad(series_list):
+    """Left-aligned zero-padded (users x months) array and each series' length"""
+    lengths = np.array([len(series) for series in series_list], dtype=np.int64)
+    values = np.zeros((len(series_list), max(lengths.max(), 1)))
+    for row, series in enumerate(series_list):
+        values[row, :len(series)] = series
+    return values, lengths
+
+
+def _linear(values, lengths, horizon):
+    """
+    Least-squares line per row
+    
+    Returns:
+        (errors, forecast, slope, spread): one-step errors of the line refitted
+        on each prefix (NaN where undefined), the h-step forecast, the final
+        slope and the h-step interval spread relative to sigma
+    """
+    rows, months = values.shape
+    x = np.arange(months, dtype=float)
+    
+    # Prefix sums give every expanding-window fit at once: the fit on months [0, t)
+    count = x[None, :]
+    sum_x = count * (count - 1) / 2
+    sum_xx = (count - 1) * count * (2 * count - 1) / 6
+    sum_y = np.cumsum(values, axis=1) - values
+    sum_xy = np.cumsum(values * x, axis=1) - values * x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count * sum_xy - sum_x * sum_y) / (count * sum_xx - sum_x ** 2)
+        intercept = (sum_y - slope * sum_x) / count
+        errors = values - (intercept + slope * x)
+    errors[:, :2] = np.nan
+    errors[x[None, :] >= lengths[:, None]] = np.nan
+    
+    n = lengths.astype(float)
+    row_index = np.arange(rows)
+    last = lengths - 1
+    total_y = np.cumsum(values, axis=1)[row_index, last]
+    total_xy = np.cumsum(values * x, axis=1)[row_index, last]
+    sxx = n * (n * n - 1) / 12  # sum of (x - mean x)^2 over 0..n-1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final_slope = np.where(n > 1, (total_xy - (n - 1) / 2 * total_y) / sxx, 0.0)
+        mean_y = total_y / n
+        target = n - 1 + horizon
+        forecast = mean_y + final_slope * (target - (n - 1) / 2)
+        spread = np.sqrt(1 + 1 / n + (target - (n - 1) / 2) ** 2 / sxx)
+    return errors, forecast, final_slope, spread
+
+
+def _holt(values, lengths, alpha, beta, keep_errors=False):
+    """
+    Holt's linear smoothing over padded rows, for every parameter column at once
+    Starts from level y1 and trend y1 - y0; rows freeze once past their length
+    
+    Args:
+        values, lengths: From _pad
+        alpha, beta: (1, G) grid or (rows, 1) per-row parameters
+        keep_errors: Also return the (rows x months) one-step errors (G must be 1)
+    
+    Returns:
+        (sse, level, trend, errors): (rows, G) arrays and errors or None
+    """
+    rows, months = values.shape
+    columns = max(alpha.shape[1], beta.shape[1])
+    level = np.repeat(values[:, 1:2], columns, axis=1)
+    trend = np.repeat(values[:, 1:2] - values[:, 0:1], columns, axis=1)
+    sse = np.zeros((rows, columns))
+    errors = np.full((rows, months), np.nan) if keep_errors else None
+    
+    for t in range(2, months):
+        active = (t < lengths)[:, None]
+        error = np.where(active, values[:, t:t + 1] - (level + trend), 0.0)
+        sse += error * error
+        if keep_errors:
+            errors[:, t] = np.where(active[:, 0], error[:, 0], np.nan)
+        step = alpha * error
+        level = np.where(active, level + trend + step, level)
+        trend = np.where(active, trend + beta * step, trend)
+    return sse, level, trend, errors
+
+
+def _holt_winters(values, lengths, alpha, beta, gamma, keep_errors=False):
+    """
+    Additive Holt-Winters over padded rows, like _holt
+    Starts from the first season's mean level, the trend between the first two
+    seasons and the first season's deviations from its mean
+    
+    Returns:
+        (sse, level, trend, seasons, errors): seasons is (rows, G, SEASON_LENGTH)
+        indexed by month position modulo SEASON_LENGTH
+    """
+    m = SEASON_LENGTH
+    rows, months = values.shape
+    columns = max(alpha.shape[1], beta.shape[1], gamma.shape[1])
+    first = values[:, :m].mean(axis=1, keepdims=True)
+    level = np.repeat(first, columns, axis=1)
+    trend = np.repeat((values[:, m:2 * m].mean(axis=1, keepdims=True) - first) / m, columns, axis=1)
+    seasons = np.repeat((values[:, :m] - first)[:, None, :], columns, axis=1)
+    sse = np.zeros((rows, columns))
+    errors = np.full((rows, months), np.nan) if keep_errors else None
+    
+    for t in range(m, months):
+        active = (t < lengths)[:, None]
+        slot = t % m
+        error = np.where(active, values[:, t:t + 1] - (level + trend + seasons[:, :, slot]), 0.0)
+        sse += error * error
+        if keep_errors:
+            errors[:, t] = np.where(active[:, 0], error[:, 0], np.nan)
+        step = alpha * error
+        level = np.where(active, level + trend + step, level)
+        trend = np.where(active, trend + beta * step, trend)
+        seasons[:, :, slot] += gamma * error
+    return sse, level, trend, seasons, errors
+
+
+def _smoothing_spread(alpha, beta, gamma, horizon):
+    """h-step interval spread relative to sigma for Holt / additive Holt-Winters"""
+    variance = np.ones_like(alpha)
+    for j in range(1, horizon):
+        variance = variance + (alpha * (1 + beta * j) + gamma * (j % SEASON_LENGTH == 0)) ** 2
+    return np.sqrt(variance)
+
+
+def _fit_block(values, lengths, horizon, cached):
+    """
+    Fit one block of padded series
+    
+    Args:
+        cached: Per-row cached parameter dicts (None to search the grid)
+    
+    Returns:
+        Per-model dict of arrays: errors, forecast, trend, spread and params
+    """
+    rows = len(lengths)
+    fits = {}
+    
+    errors, forecast, slope, spread = _linear(values, lengths, horizon)
+    fits['linear'] = {'errors': errors, 'forecast': forecast, 'trend': slope, 'spread': spread,
+                      'params': np.zeros((rows, 3))}
+    
+    for model in ('holt', 'holt_winters'):
+        eligible = lengths >= MIN_MONTHS[model]
+        params = np.full((rows, 3), np.nan)
+        for row, entry in enumerate(cached):
+            if eligible[row] and entry is not None and entry['model'] == model:
+                params[row] = (entry['alpha'], entry['beta'], entry['gamma'])
+        search = eligible & np.isnan(params[:, 0]) & np.array([entry is None for entry in cached])
+        if search.any():
+            alpha, beta, gamma = _grid(model == 'holt_winters')
+            subset_values, subset_lengths = values[search], lengths[search]
+            if model == 'holt':
+                sse = _holt(subset_values, subset_lengths, alpha, beta)[0]
+            else:
+                sse = _holt_winters(subset_values, subset_lengths, alpha, beta, gamma)[0]
+            best = np.argmin(sse, axis=1)
+            params[search] = np.stack([alpha[0, best], beta[0, best], gamma[0, best]], axis=1)
+        
+        run = ~np.isnan(params[:, 0])
+        if not run.any():
+            continue
+        alpha, beta, gamma = (params[run, i:i + 1] for i in range(3))
+        run_lengths = lengths[run]
+        model_errors = np.full(values.shape, np.nan)
+        if model == 'holt':
+            _, level, trend, run_errors = _holt(values[run], run_lengths, alpha, beta, keep_errors=True)
+            run_forecast = level[:, 0] + horizon * trend[:, 0]
+        else:
+            _, level, trend, seasons, run_errors = _holt_winters(
+                values[run], run_lengths, alpha, beta, gamma, keep_errors=True
+            )
+            slots = (run_lengths - 1 + horizon) % SEASON_LENGTH
+            run_forecast = level[:, 0] + horizon * trend[:, 0] + seasons[np.arange(len(slots)), 0, slots]
+        model_errors[run] = run_errors
+        model_forecast = np.full(rows, np.nan)
+        model_forecast[run] = run_forecast
+        model_trend = np.full(rows, np.nan)
+        model_trend[run] = trend[:, 0]
+        model_spread = np.full(rows, np.nan)
+        model_spread[run] = _smoothing_spread(alpha, beta, gamma, horizon)[:, 0]
+        fits[model] = {'errors': model_errors, 'forecast': model_forecast, 'trend': model_trend,
+                       'spread': model_spread, 'params': params}
+    
+    # Every candidate is scored on the same months: from the first month the
+    # most demanding eligible model can forecast
+    months = np.arange(values.shape[1])[None, :]
+    start = np.full(rows, 2)
+    if 'holt_winters' in fits:
+        start = np.where(~np.isnan(fits['holt_winters']['forecast']), SEASON_LENGTH, start)
+    window = (months >= start[:, None]) & (months < lengths[:, None])
+    for fit in fits.values():
+        scored = np.where(window, fit['errors'], np.nan)
+        scored_count = (~np.isnan(scored)).sum(axis=1)
+        mean_square = np.nansum(scored ** 2, axis=1) / np.maximum(scored_count, 1)
+        fit['score'] = np.where(scored_count > 0, mean_square, np.nan)
+        fit['score'][np.isnan(fit['forecast'])] = np.nan
+    return fits
+
+
+def _result(fits, row, length, chosen, from_cache, horizon):
+    """Forecast dict for one series from its block's fits"""
+    fit = fits[chosen]
+    errors = fit['errors'][row]
+    errors = errors[~np.isnan(errors)]
+    forecast = float(fit['forecast'][row])
+    sigma = float(np.sqrt(np.mean(errors ** 2))) if len(errors) else None
+    
+    intervals = None
+    if sigma is not None:
+        spread = float(fit['spread'][row]) * sigma
+        intervals = {
+            level: [round(max(forecast - z * spread, 0.0), 2), round(max(forecast + z * spread, 0.0), 2)]
+            for level, z in INTERVAL_Z.items()
+        }
+    
+    alpha, beta, gamma = fit['params'][row].tolist()
+    params = {} if chosen == 'linear' else {'alpha': alpha, 'beta': beta}
+    if chosen == 'holt_winters':
+        params['gamma'] = gamma
+    
+    return {
+        'model': chosen,
+        'horizon': horizon,
+        'forecast': round(max(forecast, 0.0), 2),
+        'trend': float(fit['trend'][row]),
+        'intervals': intervals,
+        'params': params,
+        'diagnostics': {
+            'n_months': int(length),
+            'rmse': round(sigma, 2) if sigma is not None else None,
+            'mae': round(float(np.mean(np.abs(errors))), 2) if len(errors) else None,
+            'residuals': int(len(errors)),
+            'candidates': {
+                model: round(float(np.sqrt(candidate['score'][row])), 2)
+                for model, candidate in fits.items() if not np.isnan(candidate['score'][row])
+            },
+            'cached_params': from_cache
+        }
+    }
+
+
+def forecast_monthly(series_list, horizon=1, keys=None, cache=None):
+    """
+    Forecast many users' monthly totals at once
+    
+    Args:
+        series_list: Gap-free monthly totals per user, oldest first (see dense_months)
+        horizon: Months ahead to forecast (1 = next month)
+        keys: Per-series cache keys, e.g. user ids (None entries are not cached)
+        cache: Parameter cache with get/set (e.g. cache.TTLCache), or None
+    
+    Returns:
+        One dict per series (None for an empty series): forecast, intervals
+        ({'80': [low, high], '95': [...]}, None with too few months), model,
+        params, trend (per month) and diagnostics
+    """
+    keys = list(keys) if keys is not None else [None] * len(series_list)
+    results = [None] * len(series_list)
+    
+    # Sorting by length keeps each block's padding small
+    indexed = sorted((i for i, series in enumerate(series_list) if len(series)), key=lambda i: len(series_list[i]))
+    for block_start in range(0, len(indexed), CHUNK_USERS):
+        block = indexed[block_start:block_start + CHUNK_USERS]
+        values, lengths = _pad([np.asarray(series_list[i], dtype=float) for i in block])
+        
+        cached = []
+        for i, length in zip(block, lengths):
+            entry = cache.get(keys[i]) if cache is not None and keys[i] is not None else MISSING
+            fresh = entry is not MISSING and entry['n_months'] <= length < entry['n_months'] + REFIT_AFTER_MONTHS
+            cached.append(entry if fresh else None)
+        
+        fits = _fit_block(values, lengths, horizon, cached)
+        
+        for row, i in enumerate(block):
+            entry = cached[row]
+            if lengths[row] == 1:
+                chosen = 'linear'
+            elif entry is not None:
+                chosen = entry['model']
+            else:
+                scores = [(fits[model]['score'][row], position, model) for position, model in enumerate(MODELS)
+                          if model in fits and not np.isnan(fits[model]['score'][row])]
+                chosen = min(scores)[2] if scores else 'linear'
+            results[i] = _result(fits, row, lengths[row], chosen, entry is not None, horizon)
+            
+            if cache is not None and keys[i] is not None and entry is None:
+                params = fits[chosen]['params'][row]
+                cache.set(keys[i], {
+                    'model': chosen, 'alpha': float(params[0]), 'beta': float(params[1]),
+                    'gamma': float(params[2]), 'n_months': int(lengths[row])
+                })
+    return results
+
+
+def forecast_series(series, horizon=1, key=None, cache=None):
+    """forecast_monthly for a single user's monthly totals"""
+    return forecast_monthly([series], horizon, [key], cache)[0]
@@ -0,0 +1,182 @@
+"""
+Snowflake-style id generator
+A 64-bit id packs milliseconds since EPOCH_MS (41 bits), a worker id (10 bits)
+and a per-millisecond sequence (12 bits), so one process can mint 4096 ids per
+millisecond. Ids are rendered as fixed-width Crockford base32, so string order
+matches creation order and a range of ids is a range of creation times.
+
+Ids are only unique while no two live processes share a worker id. Each process
+claims its worker id on first use by locking a slot file in ID_WORKER_LOCK_DIR,
+which keeps the processes of one host (forked workers included) apart; the lock
+is released when the process exits, however it exits. ID_WORKER_ID pins the
+slot instead, and a process whose pinned slot is already locked refuses to mint
+ids. Processes on different hosts do not see each other's locks, so a
+deployment spanning hosts must give every process its own ID_WORKER_ID.
+
+Environment:
+    ID_WORKER_ID        this process's worker id, 0-1023 (claimed automatically when unset)
+    ID_WORKER_LOCK_DIR  directory of the slot lock files (<tmp>/lifepilot-id-workers)
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 2024-01-01T00:00:00Z; 41 bits of milliseconds lasts until 2093
+EPOCH_MS = 1704067200000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford base32, sorts like its values
+ID_WIDTH = 13  # ceil(64 / 5)
+
+
+def _encode(value):
+    """Fixed-width base32 rendering of a 64-bit id"""
+    chars = []
+    for _ in range(ID_WIDTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def _lock_slot(directory, worker_id):
+    """Open and lock a worker id's slot file without blocking; None if another process holds it"""
+    lock_file = open(os.path.join(directory, f'worker-{worker_id}.lock'), 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _decode(text):
+    """Inverse of _encode"""
+    value = 0
+    for char in text:
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    """Thread-safe, time-ordered unique id generator"""
+    
+    def __init__(self, worker_id=None):
+        """
+        Args:
+            worker_id: 0-1023, unique among live processes; defaults to ID_WORKER_ID,
+                else a free slot is claimed on first use (see the module docstring)
+        """
+        self._fixed_worker = worker_id
+        self._lock = threading.Lock()
+        self._slot_file = None
+        self._pid = None  # the worker id is claimed by the first next_int() in each process
+        self.worker_id = None
+    
+    def _reset(self):
+        """Claim this process's worker id, e.g. in a freshly forked worker"""
+        if self._slot_file is not None:
+            # Inherited from the parent, which keeps its slot; only drop this copy
+            self._slot_file.close()
+            self._slot_file = None
+        self.worker_id = self._claim_worker_id()
+        self._pid = os.getpid()
+        self._last_ms = -1
+        self._sequence = 0
+    
+    def _claim_worker_id(self):
+        """
+        Lock a worker id slot for this process
+        
+        Raises:
+            ValueError: The pinned worker id is not in 0-1023
+            RuntimeError: The pinned slot is held by another process, or no slot can be claimed
+        """
+        worker_id = self._fixed_worker
+        if worker_id is None and os.getenv('ID_WORKER_ID', '') != '':
+            worker_id = os.getenv('ID_WORKER_ID')
+        directory = os.getenv('ID_WORKER_LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'lifepilot-id-workers')
+        
+        if worker_id is not None:
+            worker_id = int(worker_id)
+            if not 0 <= worker_id <= MAX_WORKER_ID:
+                raise ValueError(f"ID worker id must be 0-{MAX_WORKER_ID}, got {worker_id}")
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._slot_file = _lock_slot(directory, worker_id)
+            except OSError:
+                return worker_id  # no lock directory: trust the pinned id
+            if self._slot_file is None:
+                raise RuntimeError(f"ID worker id {worker_id} is in use by another process; "
+                                   "give each process its own ID_WORKER_ID or leave it unset")
+            return worker_id
+        
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Start at the pid so concurrently starting workers rarely race for a slot
+            start = os.getpid() & MAX_WORKER_ID
+            for offset in range(MAX_WORKER_ID + 1):
+                candidate = (start + offset) & MAX_WORKER_ID
+                self._slot_file = _lock_slot(directory, candidate)
+                if self._slot_file is not None:
+                    return candidate
+        except OSError as e:
+            raise RuntimeError(f"Cannot claim an ID worker id in {directory} ({e}); set ID_WORKER_ID")
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} ID worker ids in {directory} are in use")
+    
+    def next_int(self):
+        """Next id as an integer"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now < self._last_ms:
+                # Clock stepped back: keep issuing from the last millisecond seen
+                now = self._last_ms
+            
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 4096 ids this millisecond: wait for the next one
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = max(int(time.time() * 1000) - EPOCH_MS, now)
+            else:
+                self._sequence = 0
+            
+            self._last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+    
+    def next_id(self, prefix=''):
+        """Next id as a sortable string, e.g. 'EXP' + 13 base32 characters"""
+        return prefix + _encode(self.next_int())
+
+
+def id_timestamp(record_id, prefix=''):
+    """Creation time (epoch seconds) encoded in an id from next_id"""
+    value = _decode(record_id[len(prefix):])
+    return ((value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS) / 1000
+
+
+_default = IdGenerator()
+
+
+def new_id(prefix=''):
+    """Next id from the process-wide generator"""
+    return _default.next_id(prefix)
@@ -0,0 +1,176 @@
+"""
+Structured, non-blocking logging
+Log calls only put the record on an in-memory queue; a QueueListener thread
+formats it (as one JSON object per line by default) and writes it to stdout,
+so a request never waits on a terminal or pipe. When the queue is full records
+are dropped and counted instead of blocking.
+
+Environment:
+    LOG_LEVEL               default level (INFO)
+    LOG_FORMAT              json (default) or text
+    LOG_ENDPOINT_LEVELS     per-endpoint levels, e.g. "add_expense=WARNING,get_expenses=ERROR"
+    LOG_SAMPLE_RATES        fraction of an endpoint's records below WARNING to keep,
+                            e.g. "get_expenses=0.01,get_daily_expenses=0.05"
+    LOG_QUEUE_SIZE          records buffered before dropping (10000)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def _parse_mapping(value, convert):
+    """'a=1,b=2' -> {'a': convert('1'), 'b': convert('2')}"""
+    mapping = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, raw = item.split('=', 1)
+            mapping[key.strip()] = convert(raw.strip())
+    return mapping
+
+
+def _level(name):
+    """Numeric level for a name such as 'warning' or '30'"""
+    return int(name) if name.isdigit() else logging.getLevelName(name.upper())
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including `extra` fields"""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with `extra` fields appended as key=value pairs"""
+    
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    
+    def formatMessage(self, record):
+        # Runs before any traceback is appended, so the fields stay on the first line
+        extras = ' '.join(
+            f'{key}={value}' for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS and not key.startswith('_')
+        )
+        line = super().formatMessage(record)
+        return f'{line} {extras}' if extras else line
+
+
+class EndpointFilter(logging.Filter):
+    """Applies per-endpoint levels and sampling, and tags records with the request"""
+    
+    def __init__(self, default_level, endpoint_levels, sample_rates):
+        super().__init__()
+        self.default_level = default_level
+        self.endpoint_levels = endpoint_levels
+        self.sample_rates = sample_rates
+    
+    def filter(self, record):
+        if not has_request_context():
+            return record.levelno >= self.default_level
+        endpoint = request.endpoint
+        if record.levelno < self.endpoint_levels.get(endpoint, self.default_level):
+            return False
+        rate = self.sample_rates.get(endpoint)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        record.endpoint = endpoint
+        record.method = request.method
+        record.path = request.path
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and defers all formatting to the listener"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Only merge args here; the traceback and JSON are formatted on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(app):
+    """Route all logging through a queue to a background writer and log each request"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    default_level = _level(os.getenv('LOG_LEVEL', 'INFO'))
+    endpoint_levels = _parse_mapping(os.getenv('LOG_ENDPOINT_LEVELS'), _level)
+    sample_rates = _parse_mapping(os.getenv('LOG_SAMPLE_RATES'), float)
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(TextFormatter())
+    
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(EndpointFilter(default_level, endpoint_levels, sample_rates))
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # Let records through to the filter for any endpoint configured below the default
+    root.setLevel(min([default_level, *endpoint_levels.values()]))
+    
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    
+    request_logger = logging.getLogger('lifepilot.request')
+    
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def _log_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            request_logger.info('request', extra={
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+        return response
+    
+    app.extensions['log_queue_handler'] = queue_handler
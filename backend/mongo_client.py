@@ -0,0 +1,116 @@
+"""
+Process-wide MongoDB client registry
+Database, FileManager, AuthManager and AIAdvisor all draw their MongoClient
+from here so that each worker process holds a single connection pool
+AsyncDatabase and AsyncFileManager draw Motor clients, one per event loop
+"""
+
+import asyncio
+import os
+import threading
+from pymongo import MongoClient
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+_owner_pid = os.getpid()
+
+
+def _client_options():
+    """Build pool options from the environment"""
+    return {
+        'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+        'maxIdleTimeMS': int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 60000)),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        # Defer socket creation until the first operation so a pre-fork
+        # master never hands open sockets to its workers
+        'connect': False
+    }
+
+
+def _reset_after_fork():
+    """Forget clients inherited from the parent process"""
+    global _lock, _owner_pid
+    # The parent's sockets must not be shared, and closing them here would
+    # tear down the parent's pool too, so simply drop the references
+    _clients.clear()
+    _async_clients.clear()
+    _lock = threading.Lock()
+    _owner_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_mongo_uri():
+    """Get the configured MongoDB connection string"""
+    return os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+
+
+def get_database_name():
+    """Get the configured database name"""
+    return os.getenv('DATABASE_NAME', 'lifepilot_ai')
+
+
+def get_client(uri=None):
+    """Get the shared MongoClient for a connection string"""
+    uri = uri or get_mongo_uri()
+    
+    # Fallback for platforms without register_at_fork
+    if os.getpid() != _owner_pid:
+        _reset_after_fork()
+    
+    client = _clients.get(uri)
+    if client is None:
+        with _lock:
+            client = _clients.get(uri)
+            if client is None:
+                client = MongoClient(uri, **_client_options())
+                _clients[uri] = client
+    return client
+
+
+def get_database(name=None, uri=None):
+    """Get a database handle backed by the shared client"""
+    return get_client(uri)[name or get_database_name()]
+
+
+def get_async_client(uri=None):
+    """
+    Get the shared Motor client for a connection string on the running event loop
+    Motor clients are bound to the loop they first run on, so each loop gets its own
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    uri = uri or get_mongo_uri()
+    if os.getpid() != _owner_pid:
+        _reset_after_fork()
+    
+    loop = asyncio.get_running_loop()
+    key = (uri, id(loop))
+    entry = _async_clients.get(key)
+    if entry is None or entry[0] is not loop:
+        with _lock:
+            entry = _async_clients.get(key)
+            if entry is None or entry[0] is not loop:
+                entry = (loop, AsyncIOMotorClient(uri, io_loop=loop, **_client_options()))
+                _async_clients[key] = entry
+    return entry[1]
+
+
+def get_async_database(name=None, uri=None):
+    """Get a Motor database handle backed by the shared async client"""
+    return get_async_client(uri)[name or get_database_name()]
+
+
+def close_clients():
+    """Close every pooled client (call on worker shutdown)"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        for _, client in _async_clients.values():
+            client.close()
+        _async_clients.clear()
@@ -0,0 +1,202 @@
+"""
+Incremental spending analysis
+A SpendingAccumulator keeps the running totals analyze_spending_patterns
+derives from a full history: the total and count, per-category totals and
+counts, per-day counts (for the first/last date) and per-month totals. add()
+costs O(1), and analyze() returns the analyze_spending_patterns schema in
+O(categories) however long the history is. Expenses without a valid date are
+skipped, as the rollups skip them.
+
+Database keeps one accumulator document per user in spending_accumulators,
+updated with $inc as expenses are written (see accumulator_updates); the
+document layout is the one to_document() / from_document() use, with category
+names as field keys encoded by field_keys.encode_key. When a write
+creates a user's document, Database backfills it once from the user's full
+history, so an existing document always covers every expense.
+"""
+
+from datetime import date, datetime
+from pymongo import UpdateOne
+from field_keys import encode_key, decode_key
+
+
+def _day_key(value):
+    """'YYYY-MM-DD' for a date string or datetime, None if unknown or not a valid date"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def _amount(expense):
+    """Numeric amount of an expense (non-numbers count as 0, as in the rollups)"""
+    amount = expense.get('amount', 0)
+    return amount if isinstance(amount, (int, float)) and not isinstance(amount, bool) else 0
+
+
+class SpendingAccumulator:
+    """Running spending totals for one user"""
+    
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.categories = {}  # category -> [total, count]; uncategorised rows count towards total only
+        self.days = {}        # 'YYYY-MM-DD' -> expense count
+        self.months = {}      # 'YYYY-MM' -> total
+        self._first_date = None
+        self._last_date = None
+    
+    @classmethod
+    def from_expenses(cls, expenses):
+        """Accumulator over an iterable of expense dicts"""
+        accumulator = cls()
+        for expense in expenses:
+            accumulator.add(expense)
+        return accumulator
+    
+    def add(self, expense):
+        """Count one expense in every running total"""
+        day = _day_key(expense.get('date'))
+        if day is None:
+            return
+        amount = _amount(expense)
+        self.total += amount
+        self.count += 1
+        
+        category = expense.get('category')
+        if category is not None:
+            totals = self.categories.setdefault(category, [0, 0])
+            totals[0] += amount
+            totals[1] += 1
+        
+        month = day[:7]
+        self.months[month] = self.months.get(month, 0) + amount
+        
+        self.days[day] = self.days.get(day, 0) + 1
+        if self._first_date is None or day < self._first_date:
+            self._first_date = day
+        if self._last_date is None or day > self._last_date:
+            self._last_date = day
+    
+    @property
+    def first_date(self):
+        if self._first_date is None and self.days:
+            self._first_date = min(self.days)
+        return self._first_date
+    
+    @property
+    def last_date(self):
+        if self._last_date is None and self.days:
+            self._last_date = max(self.days)
+        return self._last_date
+    
+    def date_range(self):
+        """Days between the first and last expense (at least 1), as in analyze_spending_patterns"""
+        if not self.days:
+            return 1
+        first = date.fromisoformat(self.first_date)
+        last = date.fromisoformat(self.last_date)
+        return (last - first).days or 1
+    
+    def analyze(self, analyzer):
+        """
+        Spending analysis in the analyze_spending_patterns schema
+        
+        Args:
+            analyzer: UserDataAnalyzer whose thresholds and scoring to use
+        """
+        if self.count < 3:
+            return analyzer._insufficient_spending_data()
+        category_spending = {category: totals[0] for category, totals in sorted(self.categories.items())}
+        return analyzer._summarize_spending(category_spending, self.total, self.date_range())
+    
+    def summary(self):
+        """Totals in the Database.get_expense_summary shape"""
+        return {
+            'total': self.total,
+            'count': self.count,
+            'first_date': self.first_date,
+            'last_date': self.last_date,
+            'categories': {
+                category: {'total': totals[0], 'count': totals[1]}
+                for category, totals in self.categories.items()
+            },
+            'monthly_totals': dict(sorted(self.months.items()))
+        }
+    
+    def to_document(self):
+        """State as a spending_accumulators document body"""
+        summary = self.summary()
+        return {
+            'total': summary['total'],
+            'count': summary['count'],
+            'first_date': summary['first_date'],
+            'last_date': summary['last_date'],
+            'categories': {encode_key(category): totals for category, totals in summary['categories'].items()},
+            'days': dict(self.days),
+            'months': dict(self.months)
+        }
+    
+    @classmethod
+    def from_document(cls, document):
+        """Rebuild an accumulator from to_document() or a spending_accumulators document"""
+        accumulator = cls()
+        accumulator.total = document.get('total', 0)
+        accumulator.count = document.get('count', 0)
+        accumulator.categories = {
+            decode_key(key): [totals.get('total', 0), totals.get('count', 0)]
+            for key, totals in document.get('categories', {}).items()
+            if totals.get('count', 0) > 0
+        }
+        # Documents written before dates were validated may hold malformed day keys
+        accumulator.days = {
+            day: count for day, count in document.get('days', {}).items()
+            if count > 0 and _day_key(day) == day
+        }
+        accumulator.months = dict(document.get('months', {}))
+        # Only trust stored first/last dates that are still valid days
+        first_date, last_date = document.get('first_date'), document.get('last_date')
+        if first_date in accumulator.days and last_date in accumulator.days:
+            accumulator._first_date, accumulator._last_date = first_date, last_date
+        return accumulator
+
+
+def accumulator_updates(expenses):
+    """Group expenses into one $inc upsert per user: {user_id: UpdateOne} in first-seen order"""
+    users = {}
+    for expense in expenses:
+        user_id = expense.get('user_id')
+        day = _day_key(expense.get('date'))
+        if user_id is None or day is None:
+            continue
+        
+        update = users.setdefault(user_id, {'inc': {}, 'first_date': day, 'last_date': day})
+        inc = update['inc']
+        amount = _amount(expense)
+        for key, value in (('total', amount), ('count', 1), (f'days.{day}', 1),
+                           (f'months.{day[:7]}', amount)):
+            inc[key] = inc.get(key, 0) + value
+        
+        category = expense.get('category')
+        if category is not None:
+            key = encode_key(category)
+            inc[f'categories.{key}.total'] = inc.get(f'categories.{key}.total', 0) + amount
+            inc[f'categories.{key}.count'] = inc.get(f'categories.{key}.count', 0) + 1
+        
+        update['first_date'] = min(update['first_date'], day)
+        update['last_date'] = max(update['last_date'], day)
+    
+    now = datetime.now()
+    operations = {}
+    for user_id, update in users.items():
+        operations[user_id] = UpdateOne({'user_id': user_id}, {
+            '$inc': update['inc'],
+            '$set': {'updated_at': now},
+            '$min': {'first_date': update['first_date']},
+            '$max': {'last_date': update['last_date']}
+        }, upsert=True)
+    return operations
@@ -0,0 +1,62 @@
+"""
+Shared test setup
+The backend modules import each other by bare name, so the backend directory
+goes on sys.path. Tests that need the Flask app run it against an in-memory
+MongoDB (mongomock), swapped into the client registry before app is imported;
+they are skipped when mongomock is not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+os.environ['EXPENSE_DATA_DIR'] = ''  # cost tracker stores stay in memory
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+class _BulkWriteResult:
+    def __init__(self, upserted_ids):
+        self.upserted_ids = upserted_ids
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    """UpdateOne-only bulk_write (mongomock's rejects current pymongo operations)"""
+    upserted_ids = {}
+    for index, request in enumerate(requests):
+        result = self.update_one(request._filter, request._doc, upsert=request._upsert)
+        if result.upserted_id is not None:
+            upserted_ids[index] = result.upserted_id
+    return _BulkWriteResult(upserted_ids)
+
+
+def _use_mongomock():
+    """Point every MongoClient user at one mongomock client"""
+    mongomock = pytest.importorskip('mongomock')
+    import mongomock.gridfs
+    from mongomock.collection import Collection
+    import mongo_client
+    
+    mongomock.gridfs.enable_gridfs_integration()  # FileManager builds a GridFS on import
+    Collection.bulk_write = _bulk_write
+    client = mongomock.MongoClient()
+    mongo_client.get_client = lambda uri=None: client
+    for module_name in ('database', 'auth_manager', 'file_manager'):
+        __import__(module_name).get_client = mongo_client.get_client
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    _use_mongomock()
+    import app
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
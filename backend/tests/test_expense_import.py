@@ -0,0 +1,43 @@
+import io
+
+from pymongo.errors import BulkWriteError
+
+from expense_import import import_expenses, iter_csv_rows
+
+
+def _rows(count):
+    return [
+        (row_number, {'user_id': 'u1', 'amount': '12.5', 'category': 'Food', 'date': '2026-10-01'}, None)
+        for row_number in range(1, count + 1)
+    ]
+
+
+def test_partial_bulk_write_error_fails_only_rejected_rows():
+    def insert_batch(expenses):
+        raise BulkWriteError({'writeErrors': [
+            {'index': 1, 'code': 11000, 'errmsg': 'duplicate key'},
+            {'index': 3, 'code': 121, 'errmsg': 'validation failed'},
+        ]})
+    
+    report = import_expenses(_rows(5), insert_batch)
+    
+    assert report['imported'] == 3
+    assert report['failed'] == 2
+    assert [error['row'] for error in report['errors']] == [2, 4]
+
+
+def test_non_finite_amounts_are_row_errors():
+    rows = list(iter_csv_rows(io.BytesIO(
+        b'amount,category,date\n'
+        b'nan,Food,2026-10-01\n'
+        b'inf,Food,2026-10-02\n'
+        b'-inf,Food,2026-10-03\n'
+        b'12.5,Food,2026-10-04\n'
+    )))
+    inserted = []
+    
+    report = import_expenses(rows, inserted.extend, default_user_id='u1')
+    
+    assert report['imported'] == 1
+    assert [error['row'] for error in report['errors']] == [1, 2, 3]
+    assert [expense['amount'] for expense in inserted] == [12.5]
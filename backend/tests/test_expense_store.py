@@ -0,0 +1,28 @@
+import time
+
+from expense_journal import ExpenseJournal
+from expense_store import ExpenseStore
+
+
+def _wait_for_snapshot(journal):
+    """Block until a background snapshot write has finished"""
+    deadline = time.monotonic() + 5
+    while journal.snapshot_lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_store_recovers_from_columnar_snapshot_and_log(tmp_path):
+    store = ExpenseStore(journal=ExpenseJournal(str(tmp_path), 'expenses', snapshot_every=4))
+    for day in range(1, 11):
+        store.add({'id': f'EXP{day:03d}', 'user_id': 'u1', 'amount': float(day),
+                   'category': 'Food', 'date': f'2026-10-{day:02d}'})
+        _wait_for_snapshot(store.journal)
+    store.delete('EXP003')
+    store.journal.close()
+    
+    recovered = ExpenseStore(journal=ExpenseJournal(str(tmp_path), 'expenses'))
+    
+    assert (tmp_path / 'expenses.snapshot').exists()
+    assert recovered.user_expenses('u1') == store.user_expenses('u1')
+    assert recovered.month_totals('u1', 2026, 10) == store.month_totals('u1', 2026, 10)
+    recovered.journal.close()
@@ -0,0 +1,15 @@
+import logging
+
+from logging_setup import TextFormatter
+
+
+def test_text_format_keeps_extra_fields():
+    record = logging.LogRecord('lifepilot.request', logging.INFO, __file__, 1, 'request', None, None)
+    record.status = 201
+    record.duration_ms = 3.5
+    record.method = 'POST'
+    record.path = '/api/finance/expense'
+    
+    line = TextFormatter().format(record)
+    
+    assert line.endswith('lifepilot.request: request status=201 duration_ms=3.5 method=POST path=/api/finance/expense')
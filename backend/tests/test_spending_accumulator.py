@@ -0,0 +1,33 @@
+from data_analyzer import UserDataAnalyzer
+from spending_accumulator import SpendingAccumulator, accumulator_updates
+
+
+EXPENSES = [
+    {'user_id': 'u1', 'amount': 10, 'category': 'Food', 'date': '2026-10-01'},
+    {'user_id': 'u1', 'amount': 20, 'category': 'Food', 'date': '2026-10-05'},
+    {'user_id': 'u1', 'amount': 30, 'category': 'Rent', 'date': '2026-10-09'},
+]
+
+
+def test_malformed_dates_are_skipped():
+    malformed = [
+        {'user_id': 'u1', 'amount': 99, 'category': 'Food', 'date': '2026-13-45'},
+        {'user_id': 'u1', 'amount': 99, 'category': 'Food', 'date': 'not a date'},
+    ]
+    accumulator = SpendingAccumulator.from_expenses(EXPENSES + malformed)
+    
+    assert accumulator.count == 3
+    assert (accumulator.first_date, accumulator.last_date) == ('2026-10-01', '2026-10-09')
+    assert accumulator.analyze(UserDataAnalyzer())['total_spending'] == 60
+    assert list(accumulator_updates(malformed)) == []
+
+
+def test_stored_malformed_day_keys_do_not_break_analysis():
+    document = SpendingAccumulator.from_expenses(EXPENSES).to_document()
+    document['days']['2026-02-30'] = 1
+    document['first_date'] = '2026-02-30'
+    
+    accumulator = SpendingAccumulator.from_document(document)
+    
+    assert accumulator.first_date == '2026-10-01'
+    assert accumulator.date_range() == 8
@@ -0,0 +1,27 @@
+def _guest(client, app_module):
+    """Create a guest; returns (auth user_id, users document _id)"""
+    user_id = client.post('/api/auth/guest').get_json()['user']['user_id']
+    document = app_module.auth_manager.users_collection.find_one({'user_id': user_id})
+    return user_id, str(document['_id'])
+
+
+def test_profile_update_is_visible_to_cached_reads(client, app_module):
+    user_id, profile_id = _guest(client, app_module)
+    
+    before = client.get(f'/api/user/profile/{profile_id}').get_json()
+    assert before['data']['profile_data'] == {}
+    
+    response = client.post('/api/user/profile', json={'user_id': user_id, 'monthly_income': 5000})
+    assert response.status_code == 201
+    
+    after = client.get(f'/api/user/profile/{profile_id}').get_json()
+    assert after['data']['profile_data'] == {'monthly_income': 5000}
+
+
+def test_profile_update_bumps_the_analysis_data_version(client, app_module):
+    user_id, profile_id = _guest(client, app_module)
+    version = app_module.db.get_data_version(profile_id)
+    
+    client.post('/api/user/profile', json={'user_id': user_id, 'monthly_income': 7000})
+    
+    assert app_module.db.get_data_version(profile_id) == version + 1
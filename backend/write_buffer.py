@@ -0,0 +1,255 @@
+"""
+Write-behind insert buffer
+Groups single-document inserts into insert_many batches per collection,
+flushing when a batch is full or its oldest document is too old
+
+Callers already hold the ObjectIds of queued documents, so a failed insert is
+not dropped: documents that failed for a transient reason (connection loss,
+timeouts, write conflicts) go back to the front of their queue and are retried
+with exponential backoff. Only documents the server rejects outright (e.g. a
+duplicate key or failed validation) are counted as failed. A retried document
+that turns out to have been written by the failed attempt (duplicate _id) is
+counted as inserted.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger('lifepilot.write_buffer')
+
+# Server error codes a retry cannot fix
+DUPLICATE_KEY = 11000
+PERMANENT_ERROR_CODES = {DUPLICATE_KEY, 121, 2, 10334}  # duplicate key, validation, bad value, too large
+
+# Longest wait between retries of a failing collection (seconds)
+MAX_RETRY_BACKOFF = 60.0
+
+
+class WriteBehindBuffer:
+    """Buffered inserts for high-volume ingestion (bank sync, imports)"""
+    
+    def __init__(self, db, max_batch=500, max_delay=1.0, on_flush=None):
+        """
+        Args:
+            db: pymongo Database the buffered collections live in
+            max_batch: Flush a collection once this many documents are queued
+            max_delay: Flush a collection once its oldest document is this many seconds old
+            on_flush: Optional callback(collection_name, inserted_docs) run after each batch
+        """
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+        self.stats = {'queued': 0, 'inserted': 0, 'failed': 0, 'retried': 0, 'flushes': 0}
+        self.last_error = None  # (collection_name, message, time) of the latest failure
+        
+        self._pending = {}
+        self._oldest = {}
+        self._retry_at = {}   # collection -> time.monotonic() before which it is not retried
+        self._failures = {}   # collection -> consecutive failed flushes (drives the backoff)
+        self._attempted = set()  # _ids of queued documents an insert has already been tried for
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._pid = os.getpid()
+        self._thread = None
+        
+        atexit.register(self.close)
+    
+    def add(self, collection_name, document):
+        """
+        Queue a document for insertion
+        Returns the document's ObjectId immediately; it is assigned client-side,
+        exactly as insert_one would, so callers can reference it before the flush
+        """
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked child: the parent still owns (and will flush) what it queued
+                self._pending.clear()
+                self._oldest.clear()
+                self._retry_at.clear()
+                self._failures.clear()
+                self._attempted.clear()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._closed:
+                raise RuntimeError('Write-behind buffer is closed')
+            
+            queue = self._pending.setdefault(collection_name, [])
+            if not queue:
+                self._oldest[collection_name] = time.monotonic()
+            queue.append(document)
+            self.stats['queued'] += 1
+            full = len(queue) >= self.max_batch and time.monotonic() >= self._retry_at.get(collection_name, 0)
+            self._ensure_thread()
+        
+        if full:
+            self.flush(collection_name)
+        return document['_id']
+    
+    def _ensure_thread(self):
+        """Start the background flusher (caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        """Flush collections whose oldest queued document has waited max_delay (and whose backoff is over)"""
+        while not self._closed:
+            self._wakeup.wait(self.max_delay / 2)
+            now = time.monotonic()
+            with self._lock:
+                due = [name for name, since in self._oldest.items()
+                       if self._pending.get(name) and now - since >= self.max_delay
+                       and now >= self._retry_at.get(name, 0)]
+            for name in due:
+                self.flush(name)
+    
+    def _take(self, collection_name=None):
+        """Detach queued documents so inserts run outside the lock"""
+        with self._lock:
+            names = [collection_name] if collection_name else list(self._pending)
+            batches = {}
+            for name in names:
+                docs = self._pending.pop(name, None)
+                self._oldest.pop(name, None)
+                if docs:
+                    batches[name] = docs
+            return batches
+    
+    def _requeue(self, collection_name, docs):
+        """Put documents back at the front of their queue and back off before the next try"""
+        with self._lock:
+            queue = self._pending.setdefault(collection_name, [])
+            queue[:0] = docs
+            self._oldest.setdefault(collection_name, time.monotonic())
+            self._attempted.update(doc['_id'] for doc in docs)
+            failures = self._failures.get(collection_name, 0) + 1
+            self._failures[collection_name] = failures
+            self._retry_at[collection_name] = time.monotonic() + min(
+                self.max_delay * 2 ** (failures - 1), MAX_RETRY_BACKOFF
+            )
+            self.stats['retried'] += len(docs)
+            self._ensure_thread()
+    
+    def flush(self, collection_name=None):
+        """
+        Insert everything queued (for one collection, or all of them)
+        Documents that fail transiently stay queued (see status())
+        
+        Returns:
+            {collection_name: [inserted ids]}
+        """
+        inserted = {}
+        for name, docs in self._take(collection_name).items():
+            for start in range(0, len(docs), self.max_batch):
+                batch = docs[start:start + self.max_batch]
+                ids, retry = self._insert_batch(name, batch)
+                inserted.setdefault(name, []).extend(ids)
+                if retry is not None:
+                    # Keep order: this batch's leftovers, then every later batch, go back together
+                    self._requeue(name, retry + docs[start + self.max_batch:])
+                    break
+        return inserted
+    
+    def _insert_batch(self, collection_name, docs):
+        """
+        insert_many one batch
+        
+        Returns:
+            (ids, retry): ids that were written, and documents to retry
+            (None when nothing is left to retry)
+        """
+        retry = None
+        rejected = 0
+        try:
+            result = self.db[collection_name].insert_many(docs, ordered=False)
+            ids = list(result.inserted_ids)
+        except BulkWriteError as e:
+            written_before, rejected_indexes, retry_indexes = set(), set(), set()
+            for error in e.details.get('writeErrors', []):
+                index = error['index']
+                if (error.get('code') == DUPLICATE_KEY and docs[index]['_id'] in self._attempted
+                        and error.get('keyPattern', {'_id': 1}) == {'_id': 1}):
+                    written_before.add(index)  # an earlier, failed-looking attempt did write it
+                elif error.get('code') in PERMANENT_ERROR_CODES:
+                    rejected_indexes.add(index)
+                else:
+                    retry_indexes.add(index)
+            ids = [doc['_id'] for i, doc in enumerate(docs) if i not in rejected_indexes | retry_indexes]
+            rejected = len(rejected_indexes)
+            if retry_indexes:
+                retry = [docs[i] for i in sorted(retry_indexes)]
+            if rejected_indexes or retry_indexes:
+                self._record_error(collection_name, f"{rejected} of {len(docs)} rejected, {len(retry_indexes)} to retry: "
+                                   f"{e.details.get('writeErrors', [{}])[0].get('errmsg')}")
+        except Exception as e:
+            ids = []
+            retry = list(docs)
+            self._record_error(collection_name, f"{len(docs)} to retry: {e}")
+        
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['inserted'] += len(ids)
+            self.stats['failed'] += rejected
+            if retry is None:
+                self._failures.pop(collection_name, None)
+                self._retry_at.pop(collection_name, None)
+            retrying = {doc['_id'] for doc in retry} if retry else set()
+            self._attempted.difference_update(doc['_id'] for doc in docs if doc['_id'] not in retrying)
+        
+        if self.on_flush and ids:
+            written = set(ids)
+            try:
+                self.on_flush(collection_name, [doc for doc in docs if doc['_id'] in written])
+            except Exception:
+                logger.exception('write-behind on_flush error', extra={'collection': collection_name})
+        return ids, retry
+    
+    def _record_error(self, collection_name, message):
+        """Log a failed insert and remember it for status()"""
+        logger.error('write-behind insert failed (%s): %s', collection_name, message,
+                     extra={'collection': collection_name})
+        with self._lock:
+            self.last_error = (collection_name, message, time.time())
+    
+    def pending_count(self):
+        """Number of documents waiting to be written"""
+        with self._lock:
+            return sum(len(docs) for docs in self._pending.values())
+    
+    def status(self):
+        """Counters, documents still queued (including ones awaiting a retry) and the last error"""
+        with self._lock:
+            last_error = None
+            if self.last_error is not None:
+                collection_name, message, at = self.last_error
+                last_error = {'collection': collection_name, 'message': message, 'at': at}
+            return dict(
+                self.stats,
+                pending=sum(len(docs) for docs in self._pending.values()),
+                retrying={name: len(self._pending.get(name, [])) for name in self._failures},
+                last_error=last_error
+            )
+    
+    def close(self):
+        """Flush everything and stop the background flusher (shutdown hook)"""
+        with self._lock:
+            if self._closed:
+                return {}
+            self._closed = True
+        self._wakeup.set()
+        inserted = self.flush()
+        pending = self.pending_count()
+        if pending:
+            logger.error('write-behind buffer closed with %d documents unwritten', pending,
+                         extra={'pending': pending})
+        return inserted
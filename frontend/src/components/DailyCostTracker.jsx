@@ -98,10 +98,10 @@ const DailyCostTracker = () => {
   const getMonthlyPrediction = async () => {
     setLoading(true);
     try {
+      // The server predicts from its own copy of this month's expenses
       const response = await api.post('/api/finance/predict-monthly-cost', {
         month: currentMonth,
-        year: currentYear,
-        expenses: dailyExpenses
+        year: currentYear
       });
 
       if (response.data.success) {